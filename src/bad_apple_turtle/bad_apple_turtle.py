@@ -4,6 +4,7 @@ import turtle
 import time
 import typing
 import math
+import statistics
 
 try:
     import vlc
@@ -18,6 +19,9 @@ except ImportError:
     has_ytdlp = False
 
 import bad_apple_turtle.vector_video as vector_video
+import bad_apple_turtle.renderers as renderers
+import bad_apple_turtle.scheduler as scheduler
+import bad_apple_turtle.profiling as profiling
 
 def main():
 
@@ -55,12 +59,58 @@ def main():
         help="The approximate maximimum number of points to render in turtle. 0 means unlimited.")
     parser.add_argument('--min-area', type=float, default=-1,
         help="The minimum area of a contour required for it to be rendered.")
+    parser.add_argument('--work-width', type=int, default=0,
+        help="The width to shrink frames to before vectorizing them when using live conversion. " \
+            "0 means full resolution.")
+    parser.add_argument('--contour-cache', type=str, default=None,
+        help="Directory to cache the traced contours of videos in, so exporting the same video " \
+            "again with other --max-points or --min-area only simplifies them. " \
+            "Not used when playing a video with several jobs.")
+    parser.add_argument('--contour-cache-size', type=float, default=1024,
+        help="The most space in MiB the contour cache may take up. 0 means unlimited.")
+    parser.add_argument('--keyframe-interval', type=int, default=0,
+        help="Store a full frame every this many frames in the vector file, " \
+            "and only changes in between. 0 stores every frame in full.")
+    parser.add_argument('--point-codec', type=str, default="int32",
+        choices=tuple(vector_video.POINT_CODECS),
+        help="How points are stored in the vector file. int16 and varint make smaller files.")
+    parser.add_argument('--compression', type=str, default="none",
+        choices=tuple(vector_video.COMPRESSIONS),
+        help="Compression applied to each frame of the vector file.")
+    parser.add_argument('--lod-levels', type=float, nargs='*', default=[],
+        help="Tolerances of simplified levels of detail to store with each frame, " \
+            "as fractions of each contour's perimeter (such as 0.005 0.02).")
+    parser.add_argument('--scheduler', type=str, default="reactive",
+        choices=("reactive", "predictive"),
+        help="How playback keeps up with the video. reactive drops frames once the turtle falls " \
+            "behind by --tolerance. predictive learns how long frames take to draw and decides " \
+            "before drawing whether to simplify, cull or skip each frame.")
+    parser.add_argument('--lod', type=lod_level, default="auto",
+        help="The level of detail to play, where 0 is full detail. auto picks a level " \
+            "for each frame that can be drawn in time.")
     parser.add_argument('--no-vlc', action='store_true',
         help="Don't play video in VLC window alongside turtle.")
     parser.add_argument('--no-turtle', action='store_true',
         help="Don't play video in turtle (meant for exporting vector file).")
     parser.add_argument('--no-play', action='store_true',
         help="Don't play preview video or turtle video (meant for exporting vector file).")
+    parser.add_argument('--mmap', action='store_true',
+        help="Memory-map the --input vector file instead of reading it frame by frame.")
+    parser.add_argument('--prefetch', type=int, default=8,
+        help="Number of frames to decode ahead on a background thread while the turtle draws. 0 disables it.")
+    parser.add_argument('--cache-frames', type=int, default=256,
+        help="Number of decoded frames to keep in memory when playing a vector file. 0 means unlimited.")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help="Number of processes used to vectorize. Without the turtle, each exports its own " \
+            "part of the video, and otherwise they vectorize upcoming frames in parallel.")
+    parser.add_argument('--renderer', type=str, default="turtle",
+        choices=("turtle", "canvas", "incremental"),
+        help="How frames are drawn. canvas draws each contour as one polygon on the turtle's canvas, " \
+            "which is much faster than moving the turtle. incremental also keeps contours that " \
+            "didn't change since the last frame.")
+    parser.add_argument('--profile', type=str, default=None,
+        help="Save how long each stage took for every frame to this file, as CSV if it ends " \
+            "in .csv and JSON otherwise, and print a summary of them.")
     parser.add_argument('--debug', action='store_true',
         help="Display extra debug information in terminal.")
 
@@ -101,17 +151,59 @@ def play_animation(args: dict):
     play_vlc = video_path and not (args['no_vlc'] or args['no_play'])  and has_vlc
     play_turtle = not (args['no_turtle'] or args['no_play'])
     do_output = output_path and not vector_path
+    do_parallel_output = do_output and not play_turtle and args['jobs'] > 1
+    profiler = profiling.StageProfiler() if args['profile'] else None
 
     # Setup vector decoder
     if vector_path:
-        decoder = vector_video.VectorVideoFileDecoder(vector_path)
+        if args['mmap']:
+            decoder = vector_video.VectorVideoMmapDecoder(vector_path, args['cache_frames'],
+                profiler=profiler)
+        else:
+            decoder = vector_video.VectorVideoFileDecoder(vector_path, args['cache_frames'],
+                profiler=profiler)
         decoder.open()
+    elif do_parallel_output:
+        # The export workers vectorize frames themselves, so nothing is vectorized here
+        decoder = None
+        exporter = vector_video.ParallelVectorExporter(video_path, args['jobs'],
+            encoder_options=encoder_options(args), threshold=args["threshold"], max_points=args['max_points'], min_area=args['min_area'],
+            work_width=args['work_width'], **cache_options(args))
+    else:
+        if args['jobs'] > 1:
+            contour_provider = vector_video.ParallelContourSupplier(pathlib.Path(video_path),
+                args['jobs'], threshold=args["threshold"], max_points=args['max_points'],
+                min_area=args['min_area'], profiler=profiler, work_width=args['work_width'])
+        else:
+            contour_provider = vector_video.ContourSupplier(pathlib.Path(video_path),
+                threshold=args["threshold"], max_points=args['max_points'], min_area=args['min_area'],
+                profiler=profiler, work_width=args['work_width'], **cache_options(args))
+
+        # Stream frames to the output file as they are vectorized
+        writer = None
+        if do_output:
+            output_file = output_path.open('wb')
+            writer = vector_video.BackgroundVectorWriter(output_file,
+                vector_video.VectorVideoEncoder(contour_provider.framerate,
+                    contour_provider.frame_dimensions, **encoder_options(args)),
+                profiler=profiler, start_frame=start_frame)
+
+        decoder = vector_video.VectorVideoLiveDecoder(contour_provider, writer,
+            **encoder_options(args))
+
+    if do_parallel_output:
+        framerate, total_frames = exporter.framerate, exporter.frame_count
     else:
-        contour_provider = vector_video.ContourSupplier(pathlib.Path(video_path),
-            threshold=args["threshold"], max_points=args['max_points'], min_area=args['min_area'])
-        decoder = vector_video.VectorVideoLiveDecoder(contour_provider)
+        framerate, total_frames = decoder.framerate, decoder.total_frames
 
-    end_frame = args['frame_stop'] if args['frame_stop'] > start_frame else decoder.total_frames
+    end_frame = args['frame_stop'] if args['frame_stop'] > start_frame else total_frames
+
+    # Decode upcoming frames while the turtle is drawing
+    source_decoder = decoder
+    prefetch = play_turtle and args['prefetch'] > 0
+    if prefetch:
+        decoder = vector_video.VectorVideoPrefetchDecoder(source_decoder, args['prefetch'],
+            end_frame)
 
     # Setup turtle
     if play_turtle:
@@ -122,10 +214,31 @@ def play_animation(args: dict):
         screen = tortoise.getscreen()
         screen.tracer(0,0)
 
+        if args['renderer'] == "canvas":
+            renderer = renderers.CanvasRenderer(screen, decoder.dimensions, args["scale"])
+        elif args['renderer'] == "incremental":
+            renderer = renderers.IncrementalCanvasRenderer(screen, decoder.dimensions, args["scale"])
+        else:
+            renderer = renderers.TurtleRenderer(tortoise, decoder.dimensions, args["scale"])
+
+        # Decide how to draw frames ahead of time instead of dropping them once late
+        frame_scheduler = None
+        if args['scheduler'] == "predictive":
+            frame_scheduler = scheduler.FrameScheduler(decoder.framerate, offset_tolerance)
+
+        # Pick levels of detail to fit drawing in the time of a frame
+        lod_selector = None
+        lod_level = 0
+        if args['lod'] != "auto":
+            lod_level = args['lod']
+        elif not frame_scheduler:
+            lod_selector = scheduler.LevelOfDetailSelector(1 / decoder.framerate)
+
         # Create variables for video statistics
         max_frame_time = 0
         frames_dropped = 0
         total_time = 0
+        time_offsets = []
 
     # Play original video next to turtle
     if play_vlc:
@@ -135,7 +248,7 @@ def play_animation(args: dict):
         instance.log_unset()
         vlc_player = instance.media_player_new()
         media = instance.media_new(str(video_path.absolute()))
-        media.add_option(f'start-time={start_frame / decoder.framerate:.3f}')
+        media.add_option(f'start-time={start_frame / framerate:.3f}')
         vlc_player.set_media(media)
         vlc_player.video_set_scale(args["vlc_scale"])
         vlc_player.play()
@@ -146,25 +259,44 @@ def play_animation(args: dict):
         # Sychronize start time with video player
         start_time = -vlc_player.get_time() / 1000 + time.time()
     else:
-        start_time = time.time() - start_frame / decoder.framerate
-
-    decoder.seek(start_frame)
+        start_time = time.time() - start_frame / framerate
 
     frame_count_digits = int(math.log10(end_frame) + 1)
 
-    if do_output:
-        output_file = output_path.open('wb')
+    if do_parallel_output:
+        with output_path.open('wb') as output_file:
+            export_parallel(exporter, output_file, start_frame, end_frame)
+    else:
+        decoder.seek(start_frame)
 
-    while decoder.current_frame < end_frame:
+    while (play_turtle or (do_output and not do_parallel_output)) and decoder.current_frame < end_frame:
 
         try:
             if play_turtle:
                 # Get time before frame is drawn
                 frame_start_time = time.time()
 
-                # Clear the screen and draw new frame
-                tortoise.clear()
-                num_contours, num_points, contours_drawn = draw_path(tortoise, decoder, args["scale"])
+                frame = decoder.read()
+                frame_num = decoder.current_frame - 1
+
+                skip_frames = 0
+                if frame_scheduler:
+                    time_left = decoder.current_frame / decoder.framerate - (time.time() - start_time)
+                    drawn_frame, skip_frames = frame_scheduler.schedule(frame, time_left, lod_level)
+
+                    if drawn_frame is None:
+                        decoder.seek(skip_frames - 1, 1)
+                        frames_dropped += skip_frames
+                        continue
+                else:
+                    if lod_selector:
+                        lod_level = lod_selector.select(frame)
+                    drawn_frame = frame.level(lod_level)
+
+                # Replace the last frame with the new one
+                draw_start_time = time.time()
+                num_contours, num_points, contours_drawn = renderer.show(drawn_frame)
+                draw_time = time.time() - draw_start_time
 
                 # Get timing for frame compared to video and update statistics
                 end_time = time.time()
@@ -176,18 +308,30 @@ def play_animation(args: dict):
                 max_frame_time = max(max_frame_time, frame_render_time)
 
                 # Determine whether to skip frames or delay frame
-                skip_frames = 0
-                if time_offset > offset_tolerance:
+                if time_offset > offset_tolerance and not frame_scheduler:
                     skip_frames = int(time_offset * decoder.framerate) + 1
                     decoder.seek(skip_frames, 1)
                 elif time_offset < -offset_tolerance:
                     time.sleep(-time_offset - offset_tolerance)
 
                 # Update screen after time is re-synchronized
+                update_start_time = time.time()
                 screen.update()
+                update_time = time.time() - update_start_time
+                # Tk only really draws on update, so that's part of the cost too
+                if frame_scheduler:
+                    frame_scheduler.update(contours_drawn, num_points, draw_time + update_time)
+                if lod_selector:
+                    lod_selector.update(num_points, draw_time + update_time)
+
+                if profiler:
+                    profiler.add(frame_num, "draw", draw_time)
+                    profiler.add(frame_num, "sleep", update_start_time - end_time)
+                    profiler.add(frame_num, "update", update_time)
 
                 # Get time offset after frame delay
                 new_time_offset = time.time() - start_time - target_time
+                time_offsets.append(new_time_offset)
 
                 # Time per point prevent division by zero
                 time_per_point = int((frame_render_time / num_points)*1000000) if num_points != 0 else 0
@@ -200,6 +344,9 @@ def play_animation(args: dict):
                         f"Render time:{frame_render_time*1000: 8.2f}ms, " \
                         f"Offset:{new_time_offset*1000: 8.2f}ms, " \
                         f"Dropped: {frames_dropped}"
+
+                if frame.level_count > 1 and not frame_scheduler:
+                    stats += f", LOD: {min(lod_level, frame.level_count - 1)}"
                         
                 if args['debug']:
                     stats += f"Contours/Drawn/Points: {num_contours:03}/{contours_drawn:03}/{num_points:05}, " \
@@ -207,23 +354,27 @@ def play_animation(args: dict):
 
                 print(stats, end='')
 
-            if do_output:
-                if not play_turtle:
-                    print(f"Encoding frame {decoder.current_frame:0{frame_count_digits}}/{end_frame}  ", end='\r')
-                    decoder.read()
-                decoder.encoder.dump_continue(output_file)
+            if do_output and not play_turtle:
+                print(f"Encoding frame {decoder.current_frame:0{frame_count_digits}}/{end_frame}  ", end='\r')
+                decoder.read()
 
         except KeyboardInterrupt:
             print("\nStopping playback...")
             break
 
+    # Stop decoding ahead before finishing the output
+    if prefetch:
+        decoder.close()
+
     # Close preview video when finished
     if play_vlc:
         vlc_player.release()
 
-    # Close output file
+    # Finish writing and close output file
     if do_output:
-        output_file.close()
+        if not do_parallel_output:
+            writer.close()
+            output_file.close()
         print(f"Vector file saved as '{output_path.absolute()}'")
 
     if play_turtle:
@@ -231,7 +382,17 @@ def play_animation(args: dict):
         screen.bye()
 
     if vector_path:
-        decoder.close()
+        source_decoder.close()
+    elif not do_parallel_output:
+        contour_provider.close()
+
+        if getattr(contour_provider, 'frames_vectorized', 0) > 0:
+            frames_vectorized = contour_provider.frames_vectorized
+            print(f"\nAverage points per frame: {contour_provider.points_kept / frames_vectorized:.1f} " \
+                    f"kept of {contour_provider.points_traced / frames_vectorized:.1f} traced")
+
+        if getattr(contour_provider, 'cache', None) is not None:
+            print(f"Contour cache hits/misses: {contour_provider.cache.hits}/{contour_provider.cache.misses}")
 
     if play_turtle:
         average_frame_time = total_time / (decoder.current_frame - start_frame - frames_dropped)
@@ -239,50 +400,82 @@ def play_animation(args: dict):
                 f"Maximum Frame Time: {int(max_frame_time*1000)}ms, " \
                 f"Average Frame Time: {int(average_frame_time*1000)}ms")
 
-def draw_path(tortoise: turtle.Turtle, decoder: vector_video.VectorVideoDecoder,
-        scale: float=1.0):
-
-    contours = decoder.read()
-
-    num_contours = len(contours)
-    num_points = 0
-
-    contours_drawn = 0
+        if time_offsets:
+            print(f"Offset mean: {statistics.mean(time_offsets)*1000:.2f}ms, " \
+                    f"Offset standard deviation: {statistics.pstdev(time_offsets)*1000:.2f}ms")
+
+        if frame_scheduler:
+            print(f"Frames full/simplified/culled/skipped: {frame_scheduler.frames_full}/" \
+                    f"{frame_scheduler.frames_simplified}/{frame_scheduler.frames_culled}/" \
+                    f"{frame_scheduler.frames_skipped}")
+
+        if args['debug'] and vector_path:
+            print(f"Frame cache hits/misses: {source_decoder.cache.hits}/{source_decoder.cache.misses}")
+
+        if not vector_path and contour_provider.skip_time > 0:
+            frames_skipped = contour_provider.frames_grabbed + contour_provider.frames_seeked
+            print(f"Skipped {frames_skipped} video frames in {contour_provider.skip_time*1000:.1f}ms " \
+                    f"({frames_skipped / contour_provider.skip_time:.1f} frames/s while catching up), " \
+                    f"Grabbed/Seeked: {contour_provider.frames_grabbed}/{contour_provider.frames_seeked} " \
+                    f"in {contour_provider.seeks} seeks")
+
+        if not vector_path and contour_provider.frames_reused > 0:
+            print(f"Unchanged frames that reused the previous contours: {contour_provider.frames_reused}")
+
+        if not vector_path and isinstance(contour_provider, vector_video.ParallelContourSupplier):
+            print(f"Frames vectorized ahead and then skipped: {contour_provider.frames_discarded}")
+
+        if args['debug'] and lod_selector:
+            print(f"Frames drawn per level of detail: {lod_selector.level_counts}")
+
+    if profiler:
+        profile_path = pathlib.Path(args['profile'])
+        profiler.save(profile_path)
+        print(f"\n{profiler.format_summary()}")
+        print(f"Profile saved as '{profile_path.absolute()}'")
+
+def encoder_options(args: dict) -> dict:
+    return {'keyframe_interval': args['keyframe_interval'], 'point_codec': args['point_codec'],
+            'compression': args['compression'], 'lod_levels': args['lod_levels']}
+
+def lod_level(value: str) -> typing.Union[str, int]:
+    """
+    Parse a --lod argument, which is "auto" or a level of detail
+    """
+    if value == "auto":
+        return value
+    try:
+        level = int(value)
+    except ValueError:
+        level = -1
+    if level < 0:
+        raise argparse.ArgumentTypeError(f"must be 'auto' or a non-negative integer, not '{value}'")
+    return level
+
+def cache_options(args: dict) -> dict:
+    if not args['contour_cache']:
+        return {}
+    return {'cache_dir': pathlib.Path(args['contour_cache']),
+            'cache_bytes': int(args['contour_cache_size'] * 1024 * 1024)}
+
+def export_parallel(exporter: vector_video.ParallelVectorExporter, output_file: typing.BinaryIO,
+        start_frame: int, end_frame: int):
 
-    # Draw every curve in the path
-    for contour in contours:
-
-        num_points += len(contour)
-
-        # Make sure there is actually a contour
-        if len(contour) > 0:
-
-            # Gray line and fill based on contour
-            tortoise.color("gray", "black" if contour.color == 1 else "white")
-
-            contours_drawn += 1
-
-            # Go to initial postion without drawing
-            tortoise.up()
-            move_turtle(tortoise, contour[0], decoder.dimensions, scale)
-            tortoise.begin_fill()
-            tortoise.down()
+    frame_count_digits = int(math.log10(end_frame) + 1)
 
-            # Draw remaining points
-            for point in contour:
-                move_turtle(tortoise, point, decoder.dimensions, scale)
-            
-            # Close loop by drawing back to initial position
-            move_turtle(tortoise, contour[0], decoder.dimensions, scale)
-            tortoise.end_fill()   
+    def show_progress(frames_written: int):
+        print(f"Encoding frame {start_frame + frames_written:0{frame_count_digits}}/{end_frame}  ", end='\r')
 
-    return num_contours, num_points, contours_drawn
+    try:
+        exporter.export(output_file, start_frame, end_frame, progress=show_progress)
+    except KeyboardInterrupt:
+        print("\nStopping export...")
 
-def move_turtle(tortoise: turtle.Turtle, point: typing.Tuple[float, float],
-        frame_dimensions: typing.Tuple[int, int], scale_factor: float=1.0):
+def draw_path(tortoise: turtle.Turtle, decoder: vector_video.VectorVideoDecoder,
+        scale: float=1.0):
 
-    tortoise.goto((point[0] - frame_dimensions[0]/2) * scale_factor,
-            (frame_dimensions[1]/2 - point[1]) * scale_factor)
+    renderer = renderers.TurtleRenderer(tortoise, decoder.dimensions, scale)
+    return renderer.draw(decoder.read())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,369 @@
+import argparse
+import pathlib
+import tempfile
+import tracemalloc
+import subprocess
+import platform
+import random
+import typing
+import time
+import json
+
+import cv2
+import numpy as np
+
+import bad_apple_turtle.vector_video as vector_video
+import bad_apple_turtle.renderers as renderers
+import bad_apple_turtle.bad_apple_turtle as bad_apple_turtle
+
+# Synthetic videos as (number of shape groups, nesting depth of each group)
+SCENES = {
+    "simple": (4, 1),
+    "many": (64, 1),
+    "nested": (8, 5),
+}
+
+STAGES = ("vectorize", "encode", "decode", "seek", "draw_turtle", "draw_canvas")
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmarks each stage of vectorizing " \
+            "and playing videos on synthetic videos, without needing a display.")
+    parser.add_argument('-o', '--output', type=str, default=None,
+        help="JSON file to save the results to.")
+    parser.add_argument('-c', '--compare', type=str, default=None,
+        help="JSON file of earlier results to compare the throughput with.")
+    parser.add_argument('--scenes', type=str, nargs='*', default=list(SCENES),
+        choices=tuple(SCENES), help="The synthetic videos to benchmark.")
+    parser.add_argument('--frames', type=int, default=120,
+        help="The number of frames in each synthetic video.")
+    parser.add_argument('--width', type=int, default=480,
+        help="The width of the synthetic videos, with a 4:3 aspect ratio.")
+    parser.add_argument('--seeks', type=int, default=100,
+        help="The number of random seeks to time.")
+    parser.add_argument('--repeat', type=int, default=3,
+        help="Time each stage this many times and keep the fastest.")
+    parser.add_argument('--no-memory', action='store_true',
+        help="Don't measure peak memory, which runs every stage a second time.")
+    parser.add_argument('--work-widths', type=int, nargs='*', default=[],
+        help="Also time vectorizing at each of these working widths, compared with full " \
+            "resolution.")
+
+    args = vars(parser.parse_args())
+
+    dimensions = (args['width'], args['width'] * 3 // 4)
+    results = run_benchmarks(args['scenes'], args['frames'], dimensions, args['seeks'],
+            args['repeat'], not args['no_memory'], args['work_widths'])
+
+    print_results(results)
+
+    if args['compare']:
+        with open(args['compare']) as baseline_file:
+            print_comparison(json.load(baseline_file), results)
+
+    if args['output']:
+        with open(args['output'], 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results saved as '{pathlib.Path(args['output']).absolute()}'")
+
+def run_benchmarks(scenes: typing.Iterable[str], num_frames: int,
+        dimensions: typing.Tuple[int, int], num_seeks: int = 100, repeat: int = 3,
+        measure_memory: bool = True, work_widths: typing.Sequence[int] = ()) -> dict:
+    """
+    Benchmark every stage on each synthetic scene
+
+    :param work_widths: Optional. Working widths to also time vectorizing at
+
+    :return: The results, which can be saved as JSON
+    """
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "frames": num_frames,
+        "dimensions": list(dimensions),
+        "repeat": repeat,
+        "scenes": {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for scene in scenes:
+            video_path = pathlib.Path(directory, f"{scene}.avi")
+            generate_video(video_path, num_frames, dimensions, *SCENES[scene])
+            results["scenes"][scene] = benchmark_video(video_path,
+                    pathlib.Path(directory, f"{scene}.vec"), num_seeks, repeat, measure_memory)
+            if work_widths:
+                results["scenes"][scene]["resolutions"] = benchmark_resolutions(video_path,
+                        work_widths, repeat)
+
+    return results
+
+def generate_video(path: pathlib.Path, num_frames: int, dimensions: typing.Tuple[int, int],
+        num_groups: int, depth: int, seed: int = 0):
+    """
+    Write a black and white video of moving groups of nested shapes. The same arguments
+    always give the same video.
+
+    :param int num_groups: The number of separate groups of shapes
+    :param int depth: The number of shapes nested inside each other in every group
+    """
+    rng = np.random.default_rng(seed)
+    width, height = dimensions
+    radius = max(depth * 3, int(min(width, height) / (2 * np.sqrt(num_groups) + 2)))
+    centers = rng.uniform((radius, radius), (width - radius, height - radius), (num_groups, 2))
+    velocities = rng.uniform(-2, 2, (num_groups, 2))
+    shapes = rng.integers(0, 2, num_groups)
+    span = np.array(dimensions) - 2 * radius
+
+    # FFV1 is lossless, so thresholding gives back exactly the shapes drawn
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"FFV1"), 30, dimensions)
+    try:
+        for frame_num in range(num_frames):
+            image = np.zeros((height, width, 3), dtype=np.uint8)
+            # Bounce off the edges
+            positions = (centers + velocities * frame_num - radius) % (2 * span)
+            positions = np.minimum(positions, 2 * span - positions) + radius
+
+            for center, shape in zip(positions.astype(int).tolist(), shapes.tolist()):
+                for level in range(depth):
+                    size = radius * (depth - level) // depth
+                    color = (255, 255, 255) if level % 2 == 0 else (0, 0, 0)
+                    if shape == 0:
+                        cv2.circle(image, tuple(center), size, color, -1)
+                    else:
+                        cv2.rectangle(image, (center[0] - size, center[1] - size),
+                                (center[0] + size, center[1] + size), color, -1)
+            writer.write(image)
+    finally:
+        writer.release()
+
+def benchmark_video(video_path: pathlib.Path, vector_path: pathlib.Path, num_seeks: int = 100,
+        repeat: int = 3, measure_memory: bool = True) -> dict:
+    """
+    Time each stage on a video, writing its vector file to vector_path along the way
+    """
+    supplier = vector_video.ContourSupplier(video_path)
+    num_frames = supplier.frame_count
+    dimensions = supplier.frame_dimensions
+
+    # Each stage is set up untimed, and returns the function to time
+    contours = []
+    def vectorize() -> typing.Callable[[], None]:
+        def run():
+            contours.clear()
+            supplier.seek(0)
+            for frame_num in range(num_frames):
+                contours.append(supplier.get_contours())
+        return run
+
+    def encode() -> typing.Callable[[], None]:
+        def run():
+            encoder = vector_video.VectorVideoEncoder(supplier.framerate, dimensions)
+            for frame_contours in contours:
+                encoder.feed_contours(*frame_contours)
+            with vector_path.open("wb") as vector_file:
+                encoder.dump(vector_file)
+        return run
+
+    def decode() -> typing.Callable[[], None]:
+        def run():
+            with vector_video.VectorVideoFileDecoder(vector_path, cache_frames=1) as decoder:
+                for frame_num in range(num_frames):
+                    decoder.read()
+        return run
+
+    seek_order = random.Random(0).choices(range(num_frames), k=num_seeks)
+    def seek() -> typing.Callable[[], None]:
+        def run():
+            with vector_video.VectorVideoFileDecoder(vector_path, cache_frames=1) as decoder:
+                for frame_num in seek_order:
+                    decoder.seek(frame_num)
+                    decoder.read()
+        return run
+
+    def draw_turtle() -> typing.Callable[[], None]:
+        # Every frame is decoded into the cache first so only drawing is timed
+        decoder = vector_video.VectorVideoFileDecoder(vector_path, cache_frames=0)
+        decoder.open()
+        for frame_num in range(num_frames):
+            decoder.read()
+        decoder.seek(0)
+
+        def run():
+            tortoise = _StubTurtle()
+            for frame_num in range(num_frames):
+                tortoise.clear()
+                bad_apple_turtle.draw_path(tortoise, decoder)
+            decoder.close()
+        return run
+
+    def draw_canvas() -> typing.Callable[[], None]:
+        with vector_video.VectorVideoFileDecoder(vector_path) as decoder:
+            frames = list(decoder.read_all())
+
+        def run():
+            renderer = renderers.CanvasRenderer(_StubScreen(), dimensions)
+            for frame in frames:
+                renderer.show(frame)
+        return run
+
+    stages = dict(zip(STAGES, (vectorize, encode, decode, seek, draw_turtle, draw_canvas)))
+    stage_frames = {stage: num_frames for stage in STAGES}
+    stage_frames["seek"] = num_seeks
+
+    results = {"frames": num_frames, "points": 0, "stages": {}}
+    for stage, setup in stages.items():
+        seconds = max(min(_time(setup) for attempt in range(max(1, repeat))), 1e-9)
+        if stage == "vectorize":
+            results["points"] = sum(sum(len(contour) for contour in frame_contours[0])
+                    for frame_contours in contours)
+
+        frames = stage_frames[stage]
+        results["stages"][stage] = {
+            "seconds": seconds,
+            "frames_per_second": frames / seconds,
+            "points_per_second": results["points"] * frames / num_frames / seconds,
+            "peak_memory": _peak_memory(setup) if measure_memory else None,
+        }
+
+    results["file_size"] = vector_path.stat().st_size
+
+    return results
+
+def benchmark_resolutions(video_path: pathlib.Path, work_widths: typing.Iterable[int],
+        repeat: int = 3) -> dict:
+    """
+    Time vectorizing a video at full resolution and at each working width
+
+    :return: The throughput and points of each width, relative to full resolution, by
+        width as a string since they're saved as JSON keys
+    """
+    def vectorize(work_width: int) -> typing.Tuple[float, int]:
+        supplier = vector_video.ContourSupplier(video_path, work_width=work_width)
+        seconds = float("inf")
+        for attempt in range(max(1, repeat)):
+            supplier.seek(0)
+            points = 0
+            start_time = time.perf_counter()
+            for frame_num in range(supplier.frame_count):
+                points += sum(len(contour) for contour in supplier.get_contours()[0])
+            seconds = min(seconds, time.perf_counter() - start_time)
+        supplier.close()
+        return max(seconds, 1e-9), points
+
+    full_seconds, full_points = vectorize(0)
+    num_frames = vector_video.ContourSupplier(video_path).frame_count
+
+    results = {}
+    for work_width in (0, *work_widths):
+        seconds, points = (full_seconds, full_points) if work_width == 0 \
+                else vectorize(work_width)
+        results[str(work_width)] = {
+            "frames_per_second": num_frames / seconds,
+            "points": points,
+            "speedup": full_seconds / seconds,
+            "point_ratio": points / max(full_points, 1),
+        }
+
+    return results
+
+def print_results(results: dict):
+    for scene, scene_results in results["scenes"].items():
+        print(f"{scene}: {scene_results['frames']} frames, {scene_results['points']} points, " \
+                f"{scene_results['file_size']} byte vector file")
+        for stage, stage_results in scene_results["stages"].items():
+            memory = stage_results["peak_memory"]
+            memory = f", {memory / 1024:10.1f}KiB peak" if memory is not None else ""
+            print(f"  {stage:12} {stage_results['frames_per_second']:10.1f} frames/s " \
+                    f"{stage_results['points_per_second']:14.1f} points/s{memory}")
+        for work_width, width_results in scene_results.get("resolutions", {}).items():
+            label = f"width {work_width}" if work_width != "0" else "full width"
+            print(f"  {label:12} {width_results['frames_per_second']:10.1f} frames/s " \
+                    f"{width_results['speedup']:6.2f}x faster, {width_results['points']} points " \
+                    f"({width_results['point_ratio']:.1%})")
+
+def print_comparison(baseline: dict, results: dict):
+    """
+    Print the throughput of each stage relative to earlier results
+    """
+    print(f"Compared with {baseline.get('commit') or 'baseline'}:")
+    for scene, scene_results in results["scenes"].items():
+        baseline_scene = baseline["scenes"].get(scene)
+        if baseline_scene is None:
+            continue
+        for stage, stage_results in scene_results["stages"].items():
+            baseline_stage = baseline_scene["stages"].get(stage)
+            if baseline_stage is None:
+                continue
+            ratio = stage_results["frames_per_second"] / baseline_stage["frames_per_second"]
+            print(f"  {scene:8} {stage:12} {ratio:6.2f}x")
+
+def _time(setup: typing.Callable[[], typing.Callable[[], None]]) -> float:
+    function = setup()
+    start_time = time.perf_counter()
+    function()
+    return time.perf_counter() - start_time
+
+def _peak_memory(setup: typing.Callable[[], typing.Callable[[], None]]) -> int:
+    function = setup()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def _git_commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                cwd=pathlib.Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class _StubTurtle:
+    """
+    A stand-in for a turtle that takes every call and draws nothing
+    """
+
+    def __getattr__(self, name: str) -> typing.Callable:
+        return self._ignore
+
+    @staticmethod
+    def _ignore(*args, **kwargs):
+        pass
+
+class _StubCanvas:
+    """
+    A stand-in for a Tk canvas that only hands out item ids
+    """
+
+    _items: int
+
+    def __init__(self):
+        self._items = 0
+
+    def create_polygon(self, *args, **kwargs) -> int:
+        self._items += 1
+        return self._items
+
+    create_line = create_polygon
+
+    def __getattr__(self, name: str) -> typing.Callable:
+        return _StubTurtle._ignore
+
+class _StubScreen:
+
+    xscale = 1.0
+    yscale = 1.0
+
+    _canvas: _StubCanvas
+
+    def __init__(self):
+        self._canvas = _StubCanvas()
+
+    def getcanvas(self) -> _StubCanvas:
+        return self._canvas
+
+if __name__ == '__main__':
+    main()
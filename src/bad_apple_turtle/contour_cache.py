@@ -0,0 +1,208 @@
+import collections
+import hashlib
+import pathlib
+import struct
+import typing
+import os
+
+import numpy.typing as npt
+import numpy as np
+
+# Each cached frame is its contour and point counts, the length of every contour, its
+# points as x/y pairs, and the hierarchy (4 values per contour)
+CACHE_HEADER_FORMAT = "<II"
+CACHE_EXTENSION = ".contours"
+
+class ContourCache:
+    """
+    A least recently used cache of raw contours on disk, so the same video doesn't
+    need decoding and tracing again when only simplification or filtering changes
+
+    Every frame is a file in the cache directory named after its key and frame number.
+    Several processes can share a directory, though each only knows the size of the
+    files that existed when it was opened plus the ones it wrote itself.
+
+    Properties
+    ----------
+    directory : pathlib.Path
+        The directory the frames are stored in
+    max_bytes : int
+        The most bytes of frames to keep, or 0 for no limit
+    size : int
+        The bytes of frames currently known to be stored
+    hits : int
+        The number of lookups that found their frame
+    misses : int
+        The number of lookups that didn't
+    """
+
+    _directory: pathlib.Path
+    _max_bytes: int
+    _files: typing.OrderedDict[str, int]
+    _size: int
+    _hits: int
+    _misses: int
+
+    def __init__(self, directory: pathlib.Path, max_bytes: int = 0):
+
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._files = collections.OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+        directory.mkdir(parents=True, exist_ok=True)
+
+        # Files are touched whenever they're read, so the oldest are the least recent
+        entries = []
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(CACHE_EXTENSION) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        for mtime, name, size in sorted(entries):
+            self._files[name] = size
+            self._size += size
+
+        self._evict()
+
+    @property
+    def directory(self) -> pathlib.Path:
+        return self._directory
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @staticmethod
+    def video_key(source_path: pathlib.Path, threshold: int,
+            work_dimensions: typing.Tuple[int, int]) -> str:
+        """
+        Get the key of a video's contours, which changes if the video file is modified
+
+        :param work_dimensions: The width/height the frames are traced at
+        """
+        stat = source_path.stat()
+        identity = f"{source_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:" \
+                f"{threshold}:{work_dimensions[0]}x{work_dimensions[1]}"
+        return hashlib.sha1(identity.encode()).hexdigest()[:20]
+
+    def get(self, key: str, frame_num: int) -> \
+            typing.Optional[typing.Tuple[typing.List[npt.NDArray[np.int32]],
+            typing.Optional[npt.NDArray[np.int32]]]]:
+        """
+        Get the contours and hierarchy of a frame, or None if they aren't cached
+        """
+        name = self._name(key, frame_num)
+        path = self._directory / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            # Another process may have evicted it
+            self._forget(name)
+            self._misses += 1
+            return None
+
+        try:
+            contours, hierarchy = self._unpack(data)
+        except (struct.error, ValueError):
+            # Partly written by a process that was killed, so trace it again
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        if name in self._files:
+            self._files.move_to_end(name)
+        return contours, hierarchy
+
+    def put(self, key: str, frame_num: int, contours: typing.Sequence[npt.NDArray[np.int32]],
+            hierarchy: typing.Optional[npt.NDArray[np.int32]]):
+        """
+        Store the contours and hierarchy of a frame, evicting the least recently used
+        frames if the cache gets too large
+        """
+        name = self._name(key, frame_num)
+        data = self._pack(contours, hierarchy)
+
+        # Written under another name first so other processes never read half a frame
+        temp_path = self._directory / f"{name}.{os.getpid()}.tmp"
+        temp_path.write_bytes(data)
+        os.replace(temp_path, self._directory / name)
+
+        self._forget(name)
+        self._files[name] = len(data)
+        self._size += len(data)
+        self._evict()
+
+    def clear(self):
+        for name in list(self._files):
+            self._remove(name)
+
+    def _evict(self):
+        # Always keep the newest frame
+        while self._max_bytes and self._size > self._max_bytes and len(self._files) > 1:
+            self._remove(next(iter(self._files)))
+
+    def _remove(self, name: str):
+        self._forget(name)
+        try:
+            (self._directory / name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, name: str):
+        size = self._files.pop(name, None)
+        if size is not None:
+            self._size -= size
+
+    @staticmethod
+    def _name(key: str, frame_num: int) -> str:
+        return f"{key}_{frame_num:08}{CACHE_EXTENSION}"
+
+    @staticmethod
+    def _pack(contours: typing.Sequence[npt.NDArray[np.int32]],
+            hierarchy: typing.Optional[npt.NDArray[np.int32]]) -> bytes:
+        lengths = np.array([len(contour) for contour in contours], dtype="<i4")
+        points = np.concatenate(contours).reshape(-1, 2).astype("<i4") if len(contours) \
+                else np.empty((0, 2), dtype="<i4")
+        links = np.asarray(hierarchy, dtype="<i4").reshape(-1, 4) if hierarchy is not None \
+                else np.empty((0, 4), dtype="<i4")
+
+        return struct.pack(CACHE_HEADER_FORMAT, len(lengths), len(points)) + \
+                lengths.tobytes() + points.tobytes() + links.tobytes()
+
+    @staticmethod
+    def _unpack(data: bytes) -> typing.Tuple[typing.List[npt.NDArray[np.int32]],
+            typing.Optional[npt.NDArray[np.int32]]]:
+        num_contours, num_points = struct.unpack_from(CACHE_HEADER_FORMAT, data)
+        offset = struct.calcsize(CACHE_HEADER_FORMAT)
+
+        lengths = np.frombuffer(data, dtype="<i4", count=num_contours, offset=offset)
+        offset += lengths.nbytes
+        points = np.frombuffer(data, dtype="<i4", count=num_points * 2, offset=offset)
+        offset += points.nbytes
+        links = np.frombuffer(data, dtype="<i4", count=num_contours * 4, offset=offset)
+
+        # Shaped like OpenCV gives them, and copied so they can be changed
+        points = points.astype(np.int32).reshape(-1, 1, 2)
+        contours = np.split(points, np.cumsum(lengths[:-1])) if num_contours else []
+        hierarchy = links.astype(np.int32).reshape(1, -1, 4) if num_contours else None
+
+        return contours, hierarchy
@@ -0,0 +1,138 @@
+import collections
+import contextlib
+import threading
+import pathlib
+import typing
+import time
+import json
+import csv
+
+import numpy as np
+
+# The stages timed while playing or exporting, in the order they happen
+STAGES = ("skip", "contour_cache", "capture", "threshold", "find_contours", "simplify", "min_area", "encode",
+        "write", "decode", "draw", "sleep", "update")
+
+PERCENTILES = (50, 95, 99)
+
+class StageProfiler:
+    """
+    A class collecting how long each stage takes for every frame
+
+    Stages can be timed from any thread, so each timing is given the frame it belongs to.
+
+    Properties
+    ----------
+    frames : dict[int, dict[str, float]]
+        The seconds spent in each stage, by frame number
+    """
+
+    _frames: typing.Dict[int, typing.Dict[str, float]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._frames = collections.defaultdict(dict)
+        self._lock = threading.Lock()
+
+    @property
+    def frames(self) -> typing.Dict[int, typing.Dict[str, float]]:
+        return self._frames
+
+    def add(self, frame_num: int, stage: str, seconds: float):
+        """
+        Record time spent on a stage of a frame, adding to any time already recorded
+        """
+        with self._lock:
+            timings = self._frames[frame_num]
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def time(self, frame_num: int, stage: str) -> typing.Iterator[None]:
+        """
+        Time the code run inside the context as a stage of a frame
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(frame_num, stage, time.perf_counter() - start_time)
+
+    def stages(self) -> typing.List[str]:
+        """
+        Get every stage that was timed, in the order they happen
+        """
+        with self._lock:
+            timed = {stage for timings in self._frames.values() for stage in timings}
+        return [stage for stage in STAGES if stage in timed] + sorted(timed - set(STAGES))
+
+    def summary(self, bins: int = 20) -> typing.Dict[str, dict]:
+        """
+        Summarize the timings of each stage across frames
+
+        :param int bins: Optional, default 20. The number of histogram bins
+        :return: The count, total, mean, max, percentiles and histogram of each stage,
+            in seconds
+        """
+        summary = {}
+        for stage in self.stages():
+            with self._lock:
+                seconds = np.array([timings[stage] for timings in self._frames.values()
+                        if stage in timings])
+            counts, edges = np.histogram(seconds, bins=bins)
+            summary[stage] = {
+                "count": len(seconds),
+                "total": float(seconds.sum()),
+                "mean": float(seconds.mean()),
+                "max": float(seconds.max()),
+                **{f"p{percentile}": float(value) for percentile, value in
+                        zip(PERCENTILES, np.percentile(seconds, PERCENTILES))},
+                "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+            }
+
+        return summary
+
+    def save(self, path: pathlib.Path):
+        """
+        Save the timings as CSV if the path ends in .csv, or as JSON otherwise
+        """
+        if path.suffix.lower() == ".csv":
+            self.save_csv(path)
+        else:
+            self.save_json(path)
+
+    def save_json(self, path: pathlib.Path):
+        with self._lock:
+            frames = [{"frame": frame_num, **timings}
+                    for frame_num, timings in sorted(self._frames.items())]
+        with path.open("w") as profile_file:
+            json.dump({"stages": self.summary(), "frames": frames}, profile_file, indent=2)
+
+    def save_csv(self, path: pathlib.Path):
+        """
+        Save a row of stage timings per frame, followed by a row for each percentile
+        """
+        stages = self.stages()
+        summary = self.summary()
+        with self._lock:
+            frames = sorted(self._frames.items())
+
+        with path.open("w", newline="") as profile_file:
+            writer = csv.writer(profile_file)
+            writer.writerow(("frame", *stages))
+            for frame_num, timings in frames:
+                writer.writerow((frame_num, *(timings.get(stage, "") for stage in stages)))
+            for statistic in [f"p{percentile}" for percentile in PERCENTILES] + ["mean", "max"]:
+                writer.writerow((statistic, *(summary[stage][statistic] for stage in stages)))
+
+    def format_summary(self) -> str:
+        """
+        Format the percentiles of each stage as a table in milliseconds
+        """
+        lines = [f"{'Stage':14}{'Frames':>8}{'Total':>11}" +
+                "".join(f"{f'p{percentile}':>10}" for percentile in PERCENTILES) + f"{'Max':>10}"]
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage:14}{stats['count']:8}{stats['total'] * 1000:9.1f}ms" +
+                    "".join(f"{stats[f'p{percentile}'] * 1000:8.2f}ms"
+                    for percentile in PERCENTILES) + f"{stats['max'] * 1000:8.2f}ms")
+
+        return "\n".join(lines)
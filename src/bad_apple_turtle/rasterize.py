@@ -0,0 +1,211 @@
+import argparse
+import pathlib
+import typing
+import time
+import math
+import csv
+
+import cv2
+import numpy.typing as npt
+import numpy as np
+
+import bad_apple_turtle.vector_video as vector_video
+import bad_apple_turtle.renderers as renderers
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Renders a vector file to a video or PNG " \
+            "images without a turtle, and optionally measures how closely it matches the " \
+            "original video.")
+    parser.add_argument('-i', '--input', type=str, required=True,
+        help="Input vector file to render.")
+    parser.add_argument('-o', '--output', type=str, default=None,
+        help="Output video file, or directory to save numbered PNG images in.")
+    parser.add_argument('-c', '--compare', type=str, default=None,
+        help="Original video to compare every frame with, reporting the intersection over union.")
+    parser.add_argument('--report', type=str, default=None,
+        help="CSV file to save the intersection over union of every frame to.")
+    parser.add_argument('-ss', '--frame-start', type=int, default=0,
+        help="Set start of frame range.")
+    parser.add_argument('-to', '--frame-stop', type=int, default=-1,
+        help="Set end of frame range.")
+    parser.add_argument('--scale', type=float, default=1.0,
+        help="Scale multiplier of the rendered images.")
+    parser.add_argument('--outline', action='store_true',
+        help="Draw the gray outline the turtle draws around every curve.")
+    parser.add_argument('--fourcc', type=str, default="mp4v",
+        help="The four character code of the codec used for an output video.")
+    parser.add_argument('--threshold', type=int, default=96,
+        help="The vectorizing threshold the vector file was made with, for --compare.")
+    parser.add_argument('--mmap', action='store_true',
+        help="Memory-map the vector file instead of reading it frame by frame.")
+
+    args = vars(parser.parse_args())
+
+    vector_path = pathlib.Path(args['input'])
+    if args['mmap']:
+        decoder = vector_video.VectorVideoMmapDecoder(vector_path, cache_frames=1)
+    else:
+        decoder = vector_video.VectorVideoFileDecoder(vector_path, cache_frames=1)
+
+    with decoder:
+        start_frame = args['frame_start']
+        end_frame = args['frame_stop'] if args['frame_stop'] > start_frame else decoder.total_frames
+
+        renderer = renderers.RasterRenderer(decoder.dimensions, args['scale'], args['outline'])
+
+        sink = None
+        if args['output']:
+            sink = open_sink(pathlib.Path(args['output']), decoder.framerate,
+                    renderer.image.shape[::-1], args['fourcc'], start_frame)
+
+        source = None
+        if args['compare']:
+            source = vector_video.ContourSupplier(pathlib.Path(args['compare']),
+                    threshold=args['threshold'])
+
+        frame_count_digits = int(math.log10(max(end_frame, 1)) + 1)
+
+        def show_progress(frame_num: int):
+            print(f"Rendering frame {frame_num:0{frame_count_digits}}/{end_frame}  ", end='\r')
+
+        try:
+            frames_rendered, seconds, ious = rasterize_video(decoder, renderer, start_frame,
+                    end_frame, sink, source, show_progress)
+        finally:
+            if sink:
+                sink.close()
+
+    print(f"Rendered {frames_rendered} frames in {seconds:.2f}s " \
+            f"({frames_rendered / max(seconds, 1e-9):.1f} frames/s)")
+
+    if ious:
+        worst = int(np.argmin(ious))
+        print(f"Intersection over union mean: {np.mean(ious):.4f}, " \
+                f"minimum: {ious[worst]:.4f} (frame {start_frame + worst})")
+
+        if args['report']:
+            with open(args['report'], 'w', newline='') as report_file:
+                writer = csv.writer(report_file)
+                writer.writerow(("frame", "iou"))
+                writer.writerows(zip(range(start_frame, start_frame + len(ious)), ious))
+
+    if args['output']:
+        print(f"Rendered frames saved as '{pathlib.Path(args['output']).absolute()}'")
+
+class VideoSink:
+    """
+    A class writing rendered images to a video file
+    """
+
+    _writer: cv2.VideoWriter
+
+    def __init__(self, path: pathlib.Path, framerate: float, size: typing.Tuple[int, int],
+            fourcc: str = "mp4v"):
+
+        self._writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*fourcc), framerate,
+                size, isColor=False)
+        if not self._writer.isOpened():
+            raise OSError(f"Couldn't open '{path}' for writing with codec '{fourcc}'.")
+
+    def write(self, image: npt.NDArray[np.uint8]):
+        self._writer.write(image)
+
+    def close(self):
+        self._writer.release()
+
+class PngSink:
+    """
+    A class writing rendered images to numbered PNG files in a directory
+    """
+
+    _directory: pathlib.Path
+    _frame: int
+
+    def __init__(self, directory: pathlib.Path, start_frame: int = 0):
+
+        self._directory = directory
+        self._frame = start_frame
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, image: npt.NDArray[np.uint8]):
+        path = self._directory / f"frame_{self._frame:06}.png"
+        if not cv2.imwrite(str(path), image):
+            raise OSError(f"Couldn't write '{path}'.")
+        self._frame += 1
+
+    def close(self):
+        pass
+
+def open_sink(path: pathlib.Path, framerate: float, size: typing.Tuple[int, int],
+        fourcc: str = "mp4v", start_frame: int = 0) -> typing.Union[VideoSink, PngSink]:
+    """
+    Open a video file for rendered images, or a directory of PNG images if the path is a
+    directory or has no extension
+
+    :param size: The width/height of the images
+    :param int start_frame: Optional, default 0. The frame number of the first image,
+        which PNG images are named after
+    """
+    if path.is_dir() or not path.suffix:
+        return PngSink(path, start_frame)
+    return VideoSink(path, framerate, size, fourcc)
+
+def rasterize_video(decoder: vector_video.VectorVideoDecoder,
+        renderer: renderers.RasterRenderer, start_frame: int = 0, end_frame: int = -1,
+        sink: typing.Optional[typing.Union[VideoSink, PngSink]] = None,
+        source: typing.Optional[vector_video.ContourSupplier] = None,
+        progress: typing.Optional[typing.Callable[[int], None]] = None) -> \
+        typing.Tuple[int, float, typing.List[float]]:
+    """
+    Render a range of frames, writing them to a sink and comparing them with a source
+
+    :param sink: Optional. Where the rendered images are written
+    :param source: Optional. The original video, whose black and white frames are compared
+        with the rendered ones
+    :param progress: Optional callback receiving the frame number being rendered
+    :return: The number of frames rendered, the seconds it took, and the intersection
+        over union of every frame if there's a source
+    """
+    if end_frame < 0 or end_frame > decoder.total_frames:
+        end_frame = decoder.total_frames
+
+    decoder.seek(start_frame)
+    if source:
+        source.seek(start_frame)
+
+    ious = []
+    start_time = time.perf_counter()
+    for frame_num in range(start_frame, end_frame):
+        if progress:
+            progress(frame_num)
+
+        renderer.show(decoder.read())
+        if sink:
+            sink.write(renderer.image)
+        if source:
+            ious.append(frame_iou(renderer.image, source.read_binary()))
+
+    return end_frame - start_frame, time.perf_counter() - start_time, ious
+
+def frame_iou(image: npt.NDArray[np.uint8], binary: npt.NDArray[np.uint8]) -> float:
+    """
+    Get the intersection over union of the white areas of a rendered image and a black
+    and white source frame, resizing the image to match if needed
+
+    :param image: A rendered image, where white is 255
+    :param binary: A source frame, where white is 1
+    """
+    if image.shape != binary.shape:
+        image = cv2.resize(image, binary.shape[::-1], interpolation=cv2.INTER_AREA)
+
+    rendered = image > 127
+    original = binary > 0
+    union = np.count_nonzero(rendered | original)
+    if union == 0:
+        return 1.0
+
+    return np.count_nonzero(rendered & original) / union
+
+if __name__ == '__main__':
+    main()
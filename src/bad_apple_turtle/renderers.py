@@ -0,0 +1,376 @@
+from abc import abstractmethod
+import collections
+import bisect
+import turtle
+import typing
+
+import cv2
+import numpy.typing as npt
+import numpy as np
+
+import bad_apple_turtle.vector_video as vector_video
+
+# Colors matching the turtle's pen and fill for each contour color
+OUTLINE_COLOR = "gray"
+FILL_COLORS = {0: "white", 1: "black"}
+
+class Renderer:
+    """
+    A base class for drawing vector frames on a turtle screen
+
+    Properties
+    ----------
+    dimensions : (int, int)
+        The width/height of the video being drawn
+    scale : float
+        The scale multiplier of the drawing
+    """
+
+    _dimensions: typing.Tuple[int, int]
+    _scale: float
+
+    def __init__(self, dimensions: typing.Tuple[int, int], scale: float = 1.0):
+
+        self._dimensions = dimensions
+        self._scale = scale
+
+    @property
+    def dimensions(self) -> typing.Tuple[int, int]:
+        return self._dimensions
+
+    @property
+    def scale(self) -> float:
+        return self._scale
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def draw(self, frame: vector_video.VectorFrame) -> typing.Tuple[int, int, int]:
+        """
+        Draw a frame over whatever is currently drawn
+
+        :return: The number of contours, number of points, and number of contours drawn
+        """
+        pass
+
+    def show(self, frame: vector_video.VectorFrame) -> typing.Tuple[int, int, int]:
+        """
+        Replace the current drawing with a frame. See draw
+        """
+        self.clear()
+        return self.draw(frame)
+
+class TurtleRenderer(Renderer):
+    """
+    A class drawing frames by moving a turtle along every contour
+    """
+
+    _tortoise: turtle.Turtle
+
+    def __init__(self, tortoise: turtle.Turtle, dimensions: typing.Tuple[int, int],
+            scale: float = 1.0):
+
+        super().__init__(dimensions, scale)
+        self._tortoise = tortoise
+
+    def clear(self):
+        self._tortoise.clear()
+
+    def draw(self, frame: vector_video.VectorFrame) -> typing.Tuple[int, int, int]:
+
+        num_contours = len(frame)
+        num_points = 0
+
+        contours_drawn = 0
+
+        # Draw every curve in the path
+        for contour in frame:
+
+            num_points += len(contour)
+
+            # Make sure there is actually a contour
+            if len(contour) > 0:
+
+                # Gray line and fill based on contour
+                self._tortoise.color(OUTLINE_COLOR, FILL_COLORS[contour.color])
+
+                contours_drawn += 1
+
+                # Go to initial postion without drawing
+                self._tortoise.up()
+                self._move(contour[0])
+                self._tortoise.begin_fill()
+                self._tortoise.down()
+
+                # Draw remaining points
+                for point in contour:
+                    self._move(point)
+
+                # Close loop by drawing back to initial position
+                self._move(contour[0])
+                self._tortoise.end_fill()
+
+        return num_contours, num_points, contours_drawn
+
+    def _move(self, point: typing.Tuple[float, float]):
+        self._tortoise.goto((point[0] - self._dimensions[0]/2) * self._scale,
+                (self._dimensions[1]/2 - point[1]) * self._scale)
+
+class CanvasRenderer(Renderer):
+    """
+    A class drawing frames straight onto the Tk canvas underneath a turtle screen
+
+    Every point of a frame is transformed to canvas coordinates at once, and each
+    contour becomes a single polygon item. The result looks the same as TurtleRenderer.
+    """
+
+    TAG = "vector_frame"
+
+    _canvas: typing.Any
+    _origin: npt.NDArray[np.float64]
+    _point_scale: npt.NDArray[np.float64]
+
+    def __init__(self, screen: turtle.TurtleScreen, dimensions: typing.Tuple[int, int],
+            scale: float = 1.0):
+
+        super().__init__(dimensions, scale)
+        self._canvas = screen.getcanvas()
+
+        # Turtle coordinates are centered with y pointing up, the canvas has y pointing down
+        self._origin = np.array(dimensions, dtype=np.float64) / 2
+        self._point_scale = np.array((scale * screen.xscale, scale * screen.yscale))
+
+    def clear(self):
+        self._canvas.delete(self.TAG)
+
+    def draw(self, frame: vector_video.VectorFrame) -> typing.Tuple[int, int, int]:
+
+        contours_drawn = 0
+        counts = frame.counts.tolist()
+        for color, coords, num_points in zip(frame.colors.tolist(), self._transform(frame),
+                counts):
+            if num_points > 0:
+                self._create_item(color, coords, num_points)
+                contours_drawn += 1
+
+        return len(frame), sum(counts), contours_drawn
+
+    def _transform(self, frame: vector_video.VectorFrame) -> typing.List[typing.List[float]]:
+        """
+        Convert every contour of a frame to flat lists of canvas coordinates
+        """
+        if len(frame) == 0:
+            return []
+
+        coords = ((frame.points - self._origin) * self._point_scale).ravel().tolist()
+        offsets = (frame.offsets * 2).tolist()
+        return [coords[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def _create_item(self, color: int, coords: typing.List[float], num_points: int) -> \
+            typing.Optional[int]:
+        if num_points >= 3:
+            return self._canvas.create_polygon(coords, fill=FILL_COLORS[color],
+                    outline=OUTLINE_COLOR, width=1, tags=self.TAG)
+        elif num_points == 2:
+            # Too few points to fill, so the turtle only draws the outline
+            return self._canvas.create_line(coords, fill=OUTLINE_COLOR, width=1, tags=self.TAG)
+        return None
+
+class IncrementalCanvasRenderer(CanvasRenderer):
+    """
+    A class drawing frames on the Tk canvas while keeping items between frames
+
+    Contours identical to one in the previous frame keep their canvas item, so only new
+    contours are created and removed ones deleted. Kept items are restacked as needed
+    so the drawing order still matches the frame.
+
+    Properties
+    ----------
+    created : int
+        The number of items created for the last frame
+    deleted : int
+        The number of items deleted for the last frame
+    restacked : int
+        The number of kept items moved for the last frame
+    """
+
+    _items: typing.List[typing.Tuple[tuple, int]]
+    _created: int
+    _deleted: int
+    _restacked: int
+
+    def __init__(self, screen: turtle.TurtleScreen, dimensions: typing.Tuple[int, int],
+            scale: float = 1.0):
+
+        super().__init__(screen, dimensions, scale)
+        self._items = []
+        self._created = 0
+        self._deleted = 0
+        self._restacked = 0
+
+    @property
+    def created(self) -> int:
+        return self._created
+
+    @property
+    def deleted(self) -> int:
+        return self._deleted
+
+    @property
+    def restacked(self) -> int:
+        return self._restacked
+
+    def clear(self):
+        super().clear()
+        self._items = []
+
+    def show(self, frame: vector_video.VectorFrame) -> typing.Tuple[int, int, int]:
+
+        all_counts = frame.counts
+        contours = frame.subset(np.flatnonzero(all_counts > 0))
+        colors = contours.colors.tolist()
+        counts = contours.counts.tolist()
+        point_bytes = contours.points.astype(np.int32).tobytes()
+        offsets = (contours.offsets * 8).tolist()
+        keys = [(color, point_bytes[start:end])
+                for color, start, end in zip(colors, offsets, offsets[1:])]
+
+        # Match contours to items of the previous frame, in stacking order
+        available = collections.defaultdict(collections.deque)
+        for stack_pos, (key, item) in enumerate(self._items):
+            available[key].append((stack_pos, item))
+        matches = [available[key].popleft() if available.get(key) else None for key in keys]
+
+        for unused in available.values():
+            for stack_pos, item in unused:
+                self._canvas.delete(item)
+        self._deleted = sum(len(unused) for unused in available.values())
+
+        # The longest run of kept items already in the right order can stay where it is
+        kept = self._increasing_subsequence([match[0] if match else -1 for match in matches])
+        last_kept = max(kept) if kept else -1
+
+        new_contours = [i for i, match in enumerate(matches) if match is None]
+        new_coords = iter(self._transform(contours.subset(new_contours)))
+
+        items = []
+        self._created = 0
+        self._restacked = 0
+        for i, (key, match) in enumerate(zip(keys, matches)):
+            if match is None:
+                item = self._create_item(colors[i], next(new_coords), counts[i])
+                if item is None:
+                    continue
+                self._created += 1
+                # New items start on top, which is only right if nothing kept goes above
+                if i < last_kept:
+                    self._place(item, items)
+            else:
+                item = match[1]
+                if i not in kept:
+                    self._place(item, items)
+                    self._restacked += 1
+            items.append((key, item))
+
+        self._items = items
+
+        return len(frame), int(all_counts.sum()), len(contours)
+
+    def _place(self, item: int, items: typing.List[typing.Tuple[tuple, int]]):
+        # Put the item directly above the one before it in the frame
+        if items:
+            self._canvas.tag_raise(item, items[-1][1])
+        else:
+            self._canvas.tag_lower(item)
+
+    @staticmethod
+    def _increasing_subsequence(values: typing.List[int]) -> typing.Set[int]:
+        """
+        Find the positions of a longest strictly increasing subsequence, ignoring negatives
+        """
+        tails = []
+        tail_positions = []
+        parents = {}
+        for pos, value in enumerate(values):
+            if value < 0:
+                continue
+            length = bisect.bisect_left(tails, value)
+            if length == len(tails):
+                tails.append(value)
+                tail_positions.append(pos)
+            else:
+                tails[length] = value
+                tail_positions[length] = pos
+            parents[pos] = tail_positions[length - 1] if length > 0 else None
+
+        positions = set()
+        pos = tail_positions[-1] if tail_positions else None
+        while pos is not None:
+            positions.add(pos)
+            pos = parents[pos]
+
+        return positions
+
+class RasterRenderer(Renderer):
+    """
+    A class drawing frames into a grayscale image without needing a display
+
+    Each contour is filled in order like TurtleRenderer, so nested contours paint over
+    the ones they're in. Without outlines, the result matches the black and white frame
+    the contours were found in.
+
+    Properties
+    ----------
+    image : numpy.ndarray
+        The current drawing, with 255 for white and 0 for black
+    """
+
+    FILL_VALUES = {0: 255, 1: 0}
+    OUTLINE_VALUE = 128
+
+    _image: npt.NDArray[np.uint8]
+    _outline: bool
+
+    def __init__(self, dimensions: typing.Tuple[int, int], scale: float = 1.0,
+            outline: bool = False):
+        """
+        :param bool outline: Optional, default False. Whether to draw the gray outline
+            the turtle draws around every contour
+        """
+        super().__init__(dimensions, scale)
+        self._outline = outline
+        self._image = np.zeros((round(dimensions[1] * scale), round(dimensions[0] * scale)),
+                dtype=np.uint8)
+
+    @property
+    def image(self) -> npt.NDArray[np.uint8]:
+        return self._image
+
+    def clear(self):
+        self._image[:] = 0
+
+    def draw(self, frame: vector_video.VectorFrame) -> typing.Tuple[int, int, int]:
+
+        # Every point is scaled at once, then each contour is filled separately
+        points = frame.points
+        if self._scale != 1.0 or points.dtype != np.int32:
+            points = np.rint(points * self._scale).astype(np.int32)
+
+        contours_drawn = 0
+        offsets = frame.offsets.tolist()
+        for color, start, end in zip(frame.colors.tolist(), offsets, offsets[1:]):
+            if start == end:
+                continue
+
+            contour = points[start:end]
+            cv2.fillPoly(self._image, [contour], self.FILL_VALUES[color])
+            if self._outline:
+                cv2.polylines(self._image, [contour], True, self.OUTLINE_VALUE)
+            elif color == 1:
+                # Holes are traced along the white pixels around them, which stay white
+                cv2.polylines(self._image, [contour], True, self.FILL_VALUES[0])
+            contours_drawn += 1
+
+        return len(frame), frame.point_count, contours_drawn
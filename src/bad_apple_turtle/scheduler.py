@@ -0,0 +1,293 @@
+import typing
+import math
+
+import numpy.typing as npt
+import numpy as np
+
+import bad_apple_turtle.vector_video as vector_video
+
+class LevelOfDetailSelector:
+    """
+    A class choosing which level of detail to draw each frame at
+
+    The time it takes to draw a point is learned from the frames drawn so far, and each
+    frame is drawn at the most detailed level predicted to fit in the time budget.
+
+    Properties
+    ----------
+    budget : float
+        The time in seconds that drawing a frame should take
+    time_per_point : float
+        The smoothed time in seconds taken per point drawn, or None before any frames
+    level_counts : list[int]
+        The number of times each level was chosen
+    """
+
+    _budget: float
+    _smoothing: float
+    _time_per_point: typing.Optional[float]
+    _level_counts: typing.List[int]
+
+    def __init__(self, budget: float, smoothing: float = 0.2):
+        """
+        :param float budget: The time in seconds that drawing a frame should take
+        :param float smoothing: Optional, default 0.2. How much weight each new timing has
+        """
+        self._budget = budget
+        self._smoothing = smoothing
+        self._time_per_point = None
+        self._level_counts = []
+
+    @property
+    def budget(self) -> float:
+        return self._budget
+
+    @property
+    def time_per_point(self) -> typing.Optional[float]:
+        return self._time_per_point
+
+    @property
+    def level_counts(self) -> typing.List[int]:
+        return self._level_counts
+
+    def select(self, frame: vector_video.VectorFrame) -> int:
+        """
+        Choose the level of detail to draw a frame at
+
+        :return: The level, which falls back to the coarsest if none fit the budget
+        """
+        level = 0
+        if self._time_per_point is not None:
+            while level < frame.level_count - 1 and \
+                    self.predict(frame.level(level)) > self._budget:
+                level += 1
+
+        if level >= len(self._level_counts):
+            self._level_counts.extend([0] * (level + 1 - len(self._level_counts)))
+        self._level_counts[level] += 1
+
+        return level
+
+    def predict(self, frame: vector_video.VectorFrame) -> float:
+        """
+        Estimate how long a frame will take to draw, in seconds
+        """
+        return frame.point_count * (self._time_per_point or 0.0)
+
+    def update(self, num_points: int, render_time: float):
+        """
+        Learn from the time it took to draw a frame
+
+        :param int num_points: The number of points drawn
+        :param float render_time: The time in seconds it took
+        """
+        if num_points <= 0:
+            return
+
+        time_per_point = render_time / num_points
+        if self._time_per_point is None:
+            self._time_per_point = time_per_point
+        else:
+            self._time_per_point += self._smoothing * (time_per_point - self._time_per_point)
+
+class DrawCostModel:
+    """
+    A linear model of how long a frame takes to draw, learned from measured frames
+
+    The time is modelled as a fixed cost per frame plus a cost per contour and per point,
+    fitted by least squares with older frames gradually forgotten.
+
+    Properties
+    ----------
+    coefficients : (float, float, float)
+        The learned seconds per frame, per contour and per point
+    samples : int
+        The number of frames learned from
+    """
+
+    _forgetting: float
+    _gram: npt.NDArray[np.float64]
+    _moments: npt.NDArray[np.float64]
+    _coefficients: npt.NDArray[np.float64]
+    _samples: int
+
+    def __init__(self, forgetting: float = 0.98):
+        """
+        :param float forgetting: Optional, default 0.98. How much weight earlier frames
+            keep each time a frame is learned from
+        """
+        self._forgetting = forgetting
+        # A little regularization keeps the fit stable until frames differ enough
+        self._gram = np.eye(3) * 1e-9
+        self._moments = np.zeros(3)
+        self._coefficients = np.zeros(3)
+        self._samples = 0
+
+    @property
+    def coefficients(self) -> typing.Tuple[float, float, float]:
+        return tuple(self._coefficients.tolist())
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    def predict(self, num_contours: int, num_points: int) -> float:
+        """
+        Estimate the time in seconds to draw a number of contours and points
+        """
+        return max(0.0, float(self._coefficients @ (1.0, num_contours, num_points)))
+
+    def update(self, num_contours: int, num_points: int, render_time: float):
+        """
+        Learn from the time in seconds it took to draw a frame
+        """
+        features = np.array((1.0, num_contours, num_points))
+        self._gram = self._forgetting * self._gram + np.outer(features, features)
+        self._moments = self._forgetting * self._moments + features * render_time
+        self._samples += 1
+
+        # Costs can't be negative, so drop any term the fit makes negative and refit
+        active = np.ones(3, dtype=bool)
+        while True:
+            coefficients = np.zeros(3)
+            coefficients[active] = np.linalg.lstsq(self._gram[np.ix_(active, active)],
+                    self._moments[active], rcond=None)[0]
+            if (coefficients >= 0).all():
+                break
+            active &= coefficients > 0
+        self._coefficients = coefficients
+
+class FrameScheduler:
+    """
+    A class deciding how to draw each frame before drawing it, so playback keeps time
+
+    Each frame is drawn at the most detail predicted to finish before it's due: in full,
+    at a coarser level of detail, or with its smallest contours culled. Frames that are
+    already due, or can't be drawn in time while keeping enough of them, are skipped.
+
+    Properties
+    ----------
+    cost_model : DrawCostModel
+        The model used to predict drawing times
+    frames_full : int
+        The number of frames drawn in full
+    frames_simplified : int
+        The number of frames drawn at a coarser level of detail
+    frames_culled : int
+        The number of frames drawn with contours culled
+    frames_skipped : int
+        The number of frames skipped
+    """
+
+    _framerate: float
+    _tolerance: float
+    _min_detail: float
+    _cost_model: DrawCostModel
+    _frames_full: int
+    _frames_simplified: int
+    _frames_culled: int
+    _frames_skipped: int
+
+    def __init__(self, framerate: float, tolerance: float = 0.01, min_detail: float = 0.25,
+            cost_model: typing.Optional[DrawCostModel] = None):
+        """
+        :param float tolerance: Optional, default 0.01. How late in seconds a frame may
+            be predicted to finish
+        :param float min_detail: Optional, default 0.25. The smallest fraction of a
+            frame's points worth drawing after culling, below which it's skipped instead
+        """
+        self._framerate = framerate
+        self._tolerance = tolerance
+        self._min_detail = min_detail
+        self._cost_model = cost_model if cost_model is not None else DrawCostModel()
+        self._frames_full = 0
+        self._frames_simplified = 0
+        self._frames_culled = 0
+        self._frames_skipped = 0
+
+    @property
+    def cost_model(self) -> DrawCostModel:
+        return self._cost_model
+
+    @property
+    def frames_full(self) -> int:
+        return self._frames_full
+
+    @property
+    def frames_simplified(self) -> int:
+        return self._frames_simplified
+
+    @property
+    def frames_culled(self) -> int:
+        return self._frames_culled
+
+    @property
+    def frames_skipped(self) -> int:
+        return self._frames_skipped
+
+    def schedule(self, frame: vector_video.VectorFrame, time_left: float, level: int = 0) -> \
+            typing.Tuple[typing.Optional[vector_video.VectorFrame], int]:
+        """
+        Decide how to draw a frame
+
+        :param frame: The frame, with any levels of detail it has
+        :param float time_left: The time in seconds until the frame is due, which is
+            negative if it's already late
+        :param int level: Optional, default 0. The most detailed level to draw
+        :return: The frame to draw, or None to skip it, and the number of frames to skip
+            including this one
+        """
+        if time_left < -self._tolerance:
+            # Skip far enough that the next frame isn't due yet
+            skip_frames = max(1, math.ceil(-time_left * self._framerate))
+            self._frames_skipped += skip_frames
+            return None, skip_frames
+
+        # Nothing is known about the cost until something has been drawn
+        budget = time_left + self._tolerance
+        for level in range(min(level, frame.level_count - 1), frame.level_count):
+            if self._cost_model.samples == 0 or self._predict(frame.level(level)) <= budget:
+                if level == 0:
+                    self._frames_full += 1
+                else:
+                    self._frames_simplified += 1
+                return frame.level(level), 0
+
+        culled = self._cull(frame.level(frame.level_count - 1), budget)
+        if culled is not None:
+            self._frames_culled += 1
+            return culled, 0
+
+        self._frames_skipped += 1
+        return None, 1
+
+    def update(self, num_contours: int, num_points: int, render_time: float):
+        """
+        Learn from the time in seconds it took to draw a frame
+        """
+        self._cost_model.update(num_contours, num_points, render_time)
+
+    def _predict(self, frame: vector_video.VectorFrame) -> float:
+        return self._cost_model.predict(len(frame), frame.point_count)
+
+    def _cull(self, frame: vector_video.VectorFrame, budget: float) -> \
+            typing.Optional[vector_video.VectorFrame]:
+        """
+        Drop the smallest contours until the frame fits the budget, or give None if too
+        little would be left
+        """
+        counts = frame.counts
+        areas = vector_video.ContourSupplier.contour_areas(frame.point_arrays())
+
+        # Holes are smaller than what they're in, so they are dropped first
+        order = np.argsort(-areas, kind="stable")
+        kept_points = np.cumsum(counts[order])
+        costs = [self._cost_model.predict(i + 1, int(points))
+                for i, points in enumerate(kept_points)]
+        num_kept = int(np.searchsorted(np.maximum.accumulate(costs), budget, side="right")) \
+                if costs else 0
+
+        if num_kept == 0 or kept_points[num_kept - 1] < self._min_detail * counts.sum():
+            return None
+
+        return frame.subset(np.sort(order[:num_kept]))
@@ -1,17 +1,62 @@
 from abc import abstractmethod
 from io import BufferedReader, BufferedWriter
+from multiprocessing import shared_memory
+import concurrent.futures
+import collections
 import struct
+import mmap
+import zlib
+import lzma
+import threading
+import array
+import queue
 import pathlib
 import typing
 import math
+import time
 
 import cv2
 import numpy.typing as npt
 import numpy as np
 
-FILE_VERSIONS = (1, 2)
+import bad_apple_turtle.contour_cache as contour_cache
+import bad_apple_turtle.profiling as profiling
+
+FILE_VERSIONS = (1, 2, 3, 4, 5, 6)
+
+# Version 3 files end with a table of frame offsets followed by this trailer
+INDEX_MAGIC = b"VIDX"
+INDEX_TRAILER_FORMAT = "<I4s"
+SIDECAR_INDEX_FORMAT = "<4sQqI"
+
+# Version 4 frames start with their type. Delta frames describe each contour relative
+# to the previous frame, and repeat frames are exact copies of it.
+KEY_FRAME = 0
+DELTA_FRAME = 1
+REPEAT_FRAME = 2
+
+CONTOUR_UNCHANGED = 0
+CONTOUR_TRANSLATED = 1
+CONTOUR_NEW = 2
+
+# Version 5 stores each list of contours as arrays of colors, point counts and points,
+# with the points in one of these encodings. Frames can also be compressed, which is
+# marked with a flag on the frame type.
+POINT_CODECS = {"int32": 0, "int16": 1, "varint": 2}
+POINT_DTYPES = {0: "<i4", 1: "<i2"}
+COMPRESSIONS = {"none": 0, "zlib": 1, "lzma": 2}
+COMPRESSED_FRAME = 0x80
+
+# Version 6 frames hold one payload per level of detail, each prefixed by its size.
+# Level 0 is the full frame and later levels are simplified further.
+LEVEL_FORMAT = "<I"
 
 class VectorContour:
+    """
+    A single contour of a frame, whose points are usually a view into the frame's points
+    """
+
+    __slots__ = ("_color", "_points")
 
     _color: int
     _points: npt.ArrayLike
@@ -25,6 +70,10 @@ class VectorContour:
     def color(self) -> int:
         return self._color
 
+    @property
+    def points(self) -> npt.ArrayLike:
+        return self._points
+
     def __getitem__(self, index: typing.Union[typing.SupportsIndex, typing.Tuple[int]]) -> \
             typing.Union[npt.ArrayLike, int]:
         return self._points[index]
@@ -36,24 +85,196 @@ class VectorContour:
         return (point for point in self._points)
 
 class VectorFrame:
+    """
+    A list of contours making up a frame, along with any simplified versions of it
 
-    _contours: typing.List[VectorContour]
+    The points of every contour are kept together in one array, with the offset where
+    each contour starts and the color of each. Indexing gives VectorContour views into
+    them, while whole frames can be worked on through the arrays directly. Frames made
+    from separate arrays for each contour keep them until the joined points are needed.
 
-    def __init__(self, contours: typing.List[VectorContour] = []):
-        self._contours = contours
+    Properties
+    ----------
+    level_count : int
+        The number of levels of detail, including the full frame
+    points : numpy.ndarray
+        The x/y points of all contours, one after another
+    offsets : numpy.ndarray
+        Where each contour starts in points, followed by the total number of points
+    colors : numpy.ndarray
+        The color of each contour
+    counts : numpy.ndarray
+        The number of points in each contour
+    point_count : int
+        The total number of points
+    nbytes : int
+        The bytes taken up by the arrays of every level
+    """
 
-    def __getitem__(self, index: typing.Union[typing.SupportsIndex, typing.Tuple[int]]) -> \
-            typing.Union[VectorContour, npt.ArrayLike, int]:
+    __slots__ = ("_points", "_point_views", "_offsets", "_colors", "_levels")
+
+    _points: typing.Optional[npt.NDArray[np.integer]]
+    _point_views: typing.Optional[typing.List[npt.NDArray[np.integer]]]
+    _offsets: npt.NDArray[np.int64]
+    _colors: npt.NDArray[np.uint8]
+    _levels: typing.Tuple["VectorFrame", ...]
+
+    def __init__(self, contours: typing.Optional[typing.Sequence[VectorContour]] = None,
+            levels: typing.Sequence["VectorFrame"] = ()):
+        """
+        :param contours: Optional. The contours, whose points are copied into the frame
+        :param levels: Optional. Simplified versions of the frame, from finest to coarsest
+        """
+        contours = contours if contours is not None else ()
+        point_arrays = [np.asarray(contour[:]).reshape(-1, 2) for contour in contours]
+
+        self._points = np.concatenate(point_arrays) if point_arrays \
+                else np.empty((0, 2), dtype=np.int32)
+        self._point_views = None
+        self._offsets = self._offsets_of(np.fromiter((len(points) for points in point_arrays),
+                dtype=np.int64, count=len(point_arrays)))
+        self._colors = np.fromiter((contour.color for contour in contours), dtype=np.uint8,
+                count=len(point_arrays))
+        self._levels = tuple(levels)
+
+    @classmethod
+    def from_arrays(cls, points: npt.ArrayLike, counts: npt.ArrayLike, colors: npt.ArrayLike,
+            levels: typing.Sequence["VectorFrame"] = ()) -> "VectorFrame":
+        """
+        Make a frame straight from its arrays without copying them
+
+        :param points: The x/y points of all contours, one after another
+        :param counts: The number of points in each contour
+        :param colors: The color of each contour
+        """
+        points = np.asarray(points)
+        frame = cls.__new__(cls)
+        frame._points = points.reshape(-1, 2) if points.size else np.empty((0, 2), np.int32)
+        frame._point_views = None
+        frame._offsets = cls._offsets_of(counts)
+        frame._colors = np.asarray(colors, dtype=np.uint8)
+        frame._levels = tuple(levels)
+        return frame
+
+    @classmethod
+    def from_views(cls, point_arrays: typing.Sequence[npt.NDArray[np.integer]],
+            colors: npt.ArrayLike, levels: typing.Sequence["VectorFrame"] = ()) -> "VectorFrame":
+        """
+        Make a frame from the separate points of each contour without copying them. They
+        are only joined into one array the first time the frame's points are used.
+
+        :param point_arrays: The x/y points of each contour
+        :param colors: The color of each contour
+        """
+        frame = cls.__new__(cls)
+        frame._points = None
+        frame._point_views = list(point_arrays)
+        frame._offsets = cls._offsets_of([len(points) for points in frame._point_views])
+        frame._colors = np.asarray(colors, dtype=np.uint8)
+        frame._levels = tuple(levels)
+        return frame
+
+    @staticmethod
+    def _offsets_of(counts: npt.ArrayLike) -> npt.NDArray[np.int64]:
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets
+
+    @property
+    def level_count(self) -> int:
+        return len(self._levels) + 1
+
+    @property
+    def points(self) -> npt.NDArray[np.integer]:
+        if self._points is None:
+            self._points = np.concatenate(self._point_views) if self._point_views \
+                    else np.empty((0, 2), dtype=np.int32)
+        return self._points
+
+    @property
+    def offsets(self) -> npt.NDArray[np.int64]:
+        return self._offsets
+
+    @property
+    def colors(self) -> npt.NDArray[np.uint8]:
+        return self._colors
+
+    @property
+    def counts(self) -> npt.NDArray[np.int64]:
+        return np.diff(self._offsets)
+
+    @property
+    def point_count(self) -> int:
+        return int(self._offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level._points_nbytes() + level._offsets.nbytes + level._colors.nbytes
+                for level in (self, *self._levels))
+
+    def _points_nbytes(self) -> int:
+        nbytes = self._points.nbytes if self._points is not None else 0
+        if self._point_views is not None:
+            nbytes += sum(points.nbytes for points in self._point_views)
+        return nbytes
+
+    def level(self, level: int) -> "VectorFrame":
+        """
+        Get a level of detail of the frame, where 0 is the frame itself. Levels past the
+        coarsest give the coarsest.
+        """
+        if level <= 0 or not self._levels:
+            return self
+        return self._levels[min(level, len(self._levels)) - 1]
+
+    def with_levels(self, levels: typing.Sequence["VectorFrame"]) -> "VectorFrame":
+        """
+        Get the frame with other levels of detail, sharing its arrays
+        """
+        if self._point_views is not None:
+            return VectorFrame.from_views(self._point_views, self._colors, levels)
+        return VectorFrame.from_arrays(self._points, self.counts, self._colors, levels)
+
+    def point_arrays(self) -> typing.List[npt.NDArray[np.integer]]:
+        """
+        Get the points of every contour as views into the frame's points, or the
+        separate arrays it was made from
+        """
+        if self._point_views is not None:
+            return list(self._point_views)
+        return np.split(self._points, self._offsets[1:-1]) if len(self._colors) else []
+
+    def subset(self, indices: npt.ArrayLike) -> "VectorFrame":
+        """
+        Get a frame of only some contours, in the order given and without levels of detail
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        counts = self.counts[indices]
+        # The position of each point of the new frame in this one
+        starts = np.repeat(self._offsets[indices] - self._offsets_of(counts)[:-1], counts)
+        return VectorFrame.from_arrays(self.points[starts + np.arange(len(starts))], counts,
+                self._colors[indices])
+
+    def __getitem__(self, index: typing.Union[typing.SupportsIndex, slice, typing.Tuple[int]]) \
+            -> typing.Union[VectorContour, typing.List[VectorContour], npt.ArrayLike, int]:
 
         if type(index) == tuple:
-            return self._contours[index[0]][index[1:]]
-        return self._contours[index]
+            return self[index[0]][index[1:]]
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self._colors))[index]]
+
+        index = range(len(self._colors))[index]
+        if self._point_views is not None:
+            return VectorContour(int(self._colors[index]), self._point_views[index])
+        return VectorContour(int(self._colors[index]),
+                self._points[self._offsets[index]:self._offsets[index + 1]])
 
     def __len__(self) -> int:
-        return len(self._contours)
+        return len(self._colors)
 
     def __iter__(self) -> typing.Iterator[VectorContour]:
-        return (contour for contour in self._contours)
+        return (VectorContour(color, points) for color, points in
+                zip(self._colors.tolist(), self.point_arrays()))
 
 class VectorVideo:
 
@@ -62,9 +283,9 @@ class VectorVideo:
     _dimensions: typing.Tuple[int, int]
 
     def __init__(self, framerate: float, dimensions: typing.Tuple[int, int],
-            frames: typing.List[VectorFrame] = []):
+            frames: typing.Optional[typing.List[VectorFrame]] = None):
 
-        self._frames = frames
+        self._frames = frames if frames is not None else []
         self._framerate = framerate
         self._dimensions = dimensions
 
@@ -102,23 +323,267 @@ class VectorVideo:
     def __iter__(self) -> typing.Iterator[VectorFrame]:
         return (frame for frame in self._frames)
 
+class LazyVectorVideo(VectorVideo):
+    """
+    A read-only video whose frames are decoded from a vector file when they're accessed
+
+    Slicing gives another lazy video over the same decoder rather than decoding or
+    copying anything, and iterating decodes one frame at a time, so even whole files
+    can be walked through in constant memory. Frames go through the decoder's cache,
+    and the decoder has to stay open while the video is used.
+
+    Properties
+    ----------
+    decoder : VectorVideoFileDecoder
+        The decoder frames are read from
+    frame_numbers : range
+        The frame numbers in the file that the video is made of
+    """
+
+    _decoder: "VectorVideoFileDecoder"
+    _frame_numbers: range
+
+    def __init__(self, decoder: "VectorVideoFileDecoder",
+            frame_numbers: typing.Optional[range] = None):
+        """
+        :param frame_numbers: Optional. The frames of the file to include, defaulting to
+            all of them
+        """
+        super().__init__(decoder.framerate, decoder.dimensions)
+        self._decoder = decoder
+        self._frame_numbers = frame_numbers if frame_numbers is not None \
+                else range(decoder.total_frames)
+
+    @property
+    def decoder(self) -> "VectorVideoFileDecoder":
+        return self._decoder
+
+    @property
+    def frame_numbers(self) -> range:
+        return self._frame_numbers
+
+    def __len__(self) -> int:
+        return len(self._frame_numbers)
+
+    def __getitem__(self, index: typing.Union[typing.SupportsIndex, slice, typing.Tuple[int]]) \
+            -> typing.Union["LazyVectorVideo", VectorFrame, VectorContour, npt.ArrayLike, int]:
+
+        if type(index) == tuple:
+            return self[index[0]][index[1:]]
+        if isinstance(index, slice):
+            return LazyVectorVideo(self._decoder, self._frame_numbers[index])
+        return self._decoder.frame(self._frame_numbers[index])
+
+    def __setitem__(self, index: typing.SupportsIndex, value: VectorFrame):
+        raise TypeError("Frames decoded from a file can't be changed")
+
+    def insert(self, index: typing.SupportsIndex, value: VectorFrame):
+        raise TypeError("Frames decoded from a file can't be changed")
+
+    def append(self, value: VectorFrame):
+        raise TypeError("Frames decoded from a file can't be changed")
+
+    def __iter__(self) -> typing.Iterator[VectorFrame]:
+        return (self._decoder.frame(frame_num) for frame_num in self._frame_numbers)
+
+class FrameCache:
+    """
+    A least recently used cache of decoded frames keyed by frame number
+
+    Properties
+    ----------
+    max_frames : int
+        The most frames to keep, or 0 for no limit
+    max_bytes : int
+        The most point data in bytes to keep, or 0 for no limit
+    hits : int
+        The number of lookups that found their frame
+    misses : int
+        The number of lookups that didn't
+    """
+
+    _frames: typing.OrderedDict[int, VectorFrame]
+    _sizes: typing.Dict[int, int]
+    _max_frames: int
+    _max_bytes: int
+    _size: int
+    _hits: int
+    _misses: int
+
+    def __init__(self, max_frames: int = 256, max_bytes: int = 0):
+
+        self._frames = collections.OrderedDict()
+        self._sizes = {}
+        self._max_frames = max_frames
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def max_frames(self) -> int:
+        return self._max_frames
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, frame_num: int) -> bool:
+        return frame_num in self._frames
+
+    def get(self, frame_num: int) -> typing.Optional[VectorFrame]:
+        frame = self._frames.get(frame_num)
+        if frame is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._frames.move_to_end(frame_num)
+        return frame
+
+    def put(self, frame_num: int, frame: VectorFrame):
+        if frame_num in self._frames:
+            self._remove(frame_num)
+
+        self._frames[frame_num] = frame
+        self._sizes[frame_num] = frame.nbytes
+        self._size += self._sizes[frame_num]
+
+        # Evict least recently used frames, but always keep the newest one
+        while len(self._frames) > 1 and (
+                (self._max_frames and len(self._frames) > self._max_frames) or
+                (self._max_bytes and self._size > self._max_bytes)):
+            self._remove(next(iter(self._frames)))
+
+    def clear(self):
+        self._frames.clear()
+        self._sizes.clear()
+        self._size = 0
+
+    def _remove(self, frame_num: int):
+        del self._frames[frame_num]
+        self._size -= self._sizes.pop(frame_num)
+
 class ContourSupplier:
+    """
+    A class reading frames of a video and finding their contours
+
+    Short forward seeks grab the frames in between without decoding them, since that's
+    much faster than seeking the container. Longer seeks use whichever of the two has
+    been quicker per frame so far. Frames that are the same as the previous one once
+    thresholded reuse its contours instead of being traced again.
+
+    With a contour cache, the raw contours of every frame are stored before being
+    simplified, and frames found in it are only simplified and filtered again without
+    touching the video. Seeks are only carried out when a frame is next read from it.
+
+    Properties
+    ----------
+    work_dimensions : (int, int)
+        The width/height frames are vectorized at. Contours are always given in the
+        coordinates of the full frame.
+    frames_reused : int
+        The number of frames given the previous frame's contours
+    frames_vectorized : int
+        The number of frames contours were given for
+    points_traced : int
+        The number of points found in those frames before simplifying
+    points_kept : int
+        The number of points left after simplifying and filtering by area
+    cache : ContourCache
+        The cache of raw contours, or None
+    frames_grabbed : int
+        The number of frames skipped by grabbing
+    frames_seeked : int
+        The number of frames skipped by seeking the container
+    seeks : int
+        The number of container seeks
+    skip_time : float
+        The seconds spent skipping frames
+    """
+
+    # The stages of get_contours recorded by the profiler
+    STAGES = ("capture", "threshold", "find_contours", "simplify", "min_area")
+
+    # The range of simplification tried for max_points, as fractions of each contour's
+    # perimeter, and how closely the least simplification meeting it is found
+    SIMPLIFY_RANGE = (0.0001, 0.1)
+    SIMPLIFY_PRECISION = 1.1
 
     _source_path: pathlib.Path
     _source: cv2.VideoCapture
     _framerate: float
     _frame_count: int
     _frame_dimensions: typing.Tuple[int, int]
+    _work_dimensions: typing.Tuple[int, int]
     _threshold: int
     _current_frame: int
+    _source_frame: int
     _max_points: int
     _min_area: float
-
-    def __init__(self, source_path: pathlib.Path, threshold=96, max_points=-1, min_area=0.0):
+    _profiler: typing.Optional[profiling.StageProfiler]
+    _max_grab: int
+    _previous: typing.Optional[typing.Tuple[npt.NDArray[np.uint8], typing.List, typing.List,
+            typing.List]]
+    _frames_reused: int
+    _frames_vectorized: int
+    _points_traced: int
+    _points_kept: int
+    _cache: typing.Optional[contour_cache.ContourCache]
+    _cache_key: str
+    _grab_cost: typing.Optional[float]
+    _seek_cost: typing.Optional[float]
+    _frames_grabbed: int
+    _frames_seeked: int
+    _seeks: int
+    _skip_time: float
+
+    def __init__(self, source_path: pathlib.Path, threshold=96, max_points=-1, min_area=0.0,
+            profiler: typing.Optional[profiling.StageProfiler] = None, max_grab: int = 16,
+            work_width: int = 0, cache_dir: typing.Optional[pathlib.Path] = None,
+            cache_bytes: int = 0):
+        """
+        :param int max_grab: Optional, default 16. The most frames skipped by grabbing
+            until seeking has been timed, or 0 to always seek
+        :param int work_width: Optional, default 0. The width to shrink frames to before
+            vectorizing them, keeping the aspect ratio. 0 means full resolution.
+        :param cache_dir: Optional. The directory to cache raw contours in
+        :param int cache_bytes: Optional, default 0. The most bytes the cache may use, or
+            0 for no limit
+        """
 
         self._source_path = source_path
+        self._profiler = profiler
+        self._max_grab = max_grab
+        self._previous = None
+        self._frames_reused = 0
+        self._frames_vectorized = 0
+        self._points_traced = 0
+        self._points_kept = 0
+        self._grab_cost = None
+        self._seek_cost = None
+        self._frames_grabbed = 0
+        self._frames_seeked = 0
+        self._seeks = 0
+        self._skip_time = 0.0
         self._threshold = threshold
         self._current_frame = 0
+        self._source_frame = 0
         self._max_points = max_points
         self._min_area = min_area
         self._source = cv2.VideoCapture(str(source_path))
@@ -126,6 +591,14 @@ class ContourSupplier:
         self._frame_count = int(self._source.get(cv2.CAP_PROP_FRAME_COUNT))
         self._frame_dimensions = (int(self._source.get(cv2.CAP_PROP_FRAME_WIDTH)),
                 int(self._source.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self._work_dimensions = self.work_size(self._frame_dimensions, work_width)
+
+        self._cache = None
+        self._cache_key = ""
+        if cache_dir is not None:
+            self._cache = contour_cache.ContourCache(pathlib.Path(cache_dir), cache_bytes)
+            self._cache_key = self._cache.video_key(source_path, threshold,
+                    self._work_dimensions)
 
     @property
     def framerate(self) -> float:
@@ -139,53 +612,582 @@ class ContourSupplier:
     def frame_dimensions(self) -> typing.Tuple[int, int]:
         return self._frame_dimensions
 
+    @property
+    def work_dimensions(self) -> typing.Tuple[int, int]:
+        return self._work_dimensions
+
     @property
     def current_frame(self) -> int:
         return self._current_frame
 
+    @property
+    def frames_reused(self) -> int:
+        return self._frames_reused
+
+    @property
+    def frames_vectorized(self) -> int:
+        return self._frames_vectorized
+
+    @property
+    def points_traced(self) -> int:
+        return self._points_traced
+
+    @property
+    def points_kept(self) -> int:
+        return self._points_kept
+
+    @property
+    def cache(self) -> typing.Optional[contour_cache.ContourCache]:
+        return self._cache
+
+    @property
+    def frames_grabbed(self) -> int:
+        return self._frames_grabbed
+
+    @property
+    def frames_seeked(self) -> int:
+        return self._frames_seeked
+
+    @property
+    def seeks(self) -> int:
+        return self._seeks
+
+    @property
+    def skip_time(self) -> float:
+        return self._skip_time
+
     def seek(self, new_frame: int):
-        self._source.set(1, new_frame)
         self._current_frame = new_frame
 
+    def _sync_source(self):
+        """
+        Move the video to the current frame if it isn't there already
+        """
+        new_frame = self._current_frame
+        skip_frames = new_frame - self._source_frame
+        if skip_frames == 0:
+            return
+
+        start_time = time.perf_counter()
+        if 0 < skip_frames <= self._grab_limit():
+            grabbed = 0
+            while grabbed < skip_frames and self._source.grab():
+                grabbed += 1
+            if grabbed < skip_frames:
+                # Past the end, so make sure the capture agrees about where it is
+                self._source.set(cv2.CAP_PROP_POS_FRAMES, new_frame)
+            seconds = time.perf_counter() - start_time
+            self._grab_cost = self._smooth(self._grab_cost, seconds / skip_frames)
+            self._frames_grabbed += skip_frames
+        else:
+            self._source.set(cv2.CAP_PROP_POS_FRAMES, new_frame)
+            seconds = time.perf_counter() - start_time
+            self._seek_cost = self._smooth(self._seek_cost, seconds)
+            self._frames_seeked += abs(skip_frames)
+            self._seeks += 1
+
+        self._skip_time += seconds
+        self._source_frame = new_frame
+        if self._profiler:
+            self._profiler.add(new_frame, "skip", seconds)
+
+    def _grab_limit(self) -> float:
+        if self._max_grab <= 0:
+            return 0
+        if self._grab_cost is None or self._seek_cost is None:
+            return self._max_grab
+        # Grab as long as it's expected to take less time than a seek
+        return self._seek_cost / max(self._grab_cost, 1e-9)
+
+    @staticmethod
+    def _smooth(average: typing.Optional[float], value: float) -> float:
+        return value if average is None else average + 0.25 * (value - average)
+
     def get_contours(self) -> typing.Tuple[typing.List, typing.List]:
+        frame_num = self._current_frame
+        cache_time = 0.0
+        if self._cache is not None and frame_num < self._frame_count:
+            start_time = time.perf_counter()
+            cached = self._cache.get(self._cache_key, frame_num)
+            cache_time = time.perf_counter() - start_time
+            if cached is not None:
+                contours, hierarchy = cached
+                approx, durations = self.simplify_contours(contours, self._max_points,
+                        self._min_area)
+                self._current_frame += 1
+                self._previous = None
+                self._count_points(contours, approx)
+
+                if self._profiler:
+                    self._profiler.add(frame_num, "contour_cache", cache_time)
+                    for stage, seconds in zip(self.STAGES[3:], durations):
+                        self._profiler.add(frame_num, stage, seconds)
+
+                return approx, hierarchy
+
+        # Catching up to the frame is timed as skipping rather than capturing
+        skip_time = self._skip_time
+        start_time = time.perf_counter()
+        orig = self.read_frame()
+        capture_time = time.perf_counter() - start_time - (self._skip_time - skip_time)
+
+        start_time = time.perf_counter()
+        image = self.binarize(orig, self._threshold, self._work_dimensions)
+        if self._previous is not None and np.array_equal(image, self._previous[0]):
+            # Nothing changed, so neither can the contours
+            contours, hierarchy, approx = self._previous[1:]
+            durations = [time.perf_counter() - start_time]
+            self._frames_reused += 1
+        else:
+            threshold_time = time.perf_counter() - start_time
+            contours, hierarchy, find_time = self.raw_contours(image, orig.shape[1::-1])
+            approx, durations = self.simplify_contours(contours, self._max_points,
+                    self._min_area)
+            durations[:0] = [threshold_time, find_time]
+            self._previous = (image, contours, hierarchy, approx)
+
+        self._count_points(contours, approx)
+
+        if self._cache is not None:
+            start_time = time.perf_counter()
+            self._cache.put(self._cache_key, frame_num, contours, hierarchy)
+            cache_time += time.perf_counter() - start_time
+
+        if self._profiler:
+            for stage, seconds in zip(self.STAGES, (capture_time, *durations)):
+                self._profiler.add(frame_num, stage, seconds)
+            if self._cache is not None:
+                self._profiler.add(frame_num, "contour_cache", cache_time)
+
+        return list(approx), hierarchy
+
+    def _count_points(self, contours: typing.List, approx: typing.List):
+        self._frames_vectorized += 1
+        self._points_traced += sum(len(contour) for contour in contours)
+        self._points_kept += sum(len(contour) for contour in approx)
+
+    def read_frame(self) -> npt.NDArray[np.uint8]:
+        """
+        Read the next frame of the video as it is
+        """
+        self._sync_source()
         success, orig = self._source.read()
+        if not success:
+            raise EOFError("No frames left to read")
+
+        self._current_frame += 1
+        self._source_frame += 1
+
+        return orig
+
+    def read_binary(self) -> npt.NDArray[np.uint8]:
+        """
+        Read the next frame as the black and white image its contours are found in,
+        with 1 for white and 0 for black
+        """
+        return self.binarize(self.read_frame(), self._threshold)
+
+    def close(self):
+        """
+        Release the video
+        """
+        self._source.release()
+
+    @staticmethod
+    def binarize(image: npt.NDArray[np.uint8], threshold: int,
+            work_dimensions: typing.Optional[typing.Tuple[int, int]] = None) -> \
+            npt.NDArray[np.uint8]:
+        """
+        Threshold a frame, first shrinking it to work_dimensions if they're given
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if work_dimensions is not None and tuple(work_dimensions) != gray.shape[::-1]:
+            # Shrinking the gray image is a third of the work of shrinking in color
+            gray = cv2.resize(gray, tuple(work_dimensions), interpolation=cv2.INTER_AREA)
+        return cv2.threshold(gray, threshold, 1, cv2.THRESH_BINARY)[1]
+
+    @staticmethod
+    def work_size(dimensions: typing.Tuple[int, int], work_width: int) -> \
+            typing.Tuple[int, int]:
+        """
+        Get the width/height to vectorize frames of the given dimensions at, which is
+        never larger than the frames themselves
+        """
+        width, height = dimensions
+        if work_width <= 0 or work_width >= width:
+            return dimensions
+        return work_width, max(1, round(height * work_width / width))
+
+    @staticmethod
+    def find_contours(orig: npt.NDArray[np.uint8], threshold: int, max_points: int,
+            min_area: float, work_dimensions: typing.Optional[typing.Tuple[int, int]] = None) \
+            -> typing.Tuple[typing.List, typing.List, typing.List[float]]:
+        """
+        Find the simplified contours of a frame. This only depends on its arguments, so
+        other processes can run it too.
+
+        :param work_dimensions: Optional. The width/height to shrink the frame to before
+            vectorizing it. The contours are scaled back to the frame's coordinates.
+        :return: The contours, their hierarchy, and the seconds spent thresholding,
+            finding contours, simplifying and filtering by area
+        """
+        start_time = time.perf_counter()
 
         # Convert video to black and white
-        image = cv2.threshold(cv2.cvtColor(orig, cv2.COLOR_BGR2GRAY), self._threshold, 1,
-                cv2.THRESH_BINARY)[1]
+        image = ContourSupplier.binarize(orig, threshold, work_dimensions)
+        threshold_time = time.perf_counter() - start_time
 
-        self._current_frame += 1
+        approx, hierarchy, durations = ContourSupplier.trace_contours(image, orig.shape[1::-1],
+                max_points, min_area)
+
+        return approx, hierarchy, [threshold_time, *durations]
+
+    @staticmethod
+    def trace_contours(image: npt.NDArray[np.uint8], dimensions: typing.Tuple[int, int],
+            max_points: int, min_area: float) -> \
+            typing.Tuple[typing.List, typing.List, typing.List[float]]:
+        """
+        Find the simplified contours of a black and white image
+
+        :param dimensions: The width/height of the frame the image was made from, which
+            the contours are scaled to
+        :return: The contours, their hierarchy, and the seconds spent finding contours,
+            simplifying and filtering by area
+        """
+        contours, hierarchy, find_time = ContourSupplier.raw_contours(image, dimensions)
+        approx, durations = ContourSupplier.simplify_contours(contours, max_points, min_area)
+
+        return approx, hierarchy, [find_time, *durations]
+
+    @staticmethod
+    def raw_contours(image: npt.NDArray[np.uint8], dimensions: typing.Tuple[int, int]) -> \
+            typing.Tuple[typing.List, typing.List, float]:
+        """
+        Find the contours of a black and white image before any simplification
+
+        :param dimensions: The width/height of the frame the image was made from, which
+            the contours are scaled to
+        :return: The contours, their hierarchy, and the seconds it took
+        """
+        start_time = time.perf_counter()
 
         # Vectorize
         contours, hierarchy = cv2.findContours(image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
+        contours = list(contours)
+        if contours and image.shape != tuple(dimensions[::-1]):
+            # Points are pixel centers, so map the centers of the shrunk pixels back
+            scale = np.array(dimensions) / image.shape[::-1]
+            points = np.rint((np.concatenate(contours) + 0.5) * scale - 0.5).astype(np.int32)
+            contours = np.split(points, np.cumsum([len(contour) for contour in contours[:-1]]))
+
+        return contours, hierarchy, time.perf_counter() - start_time
+
+    @staticmethod
+    def simplify_contours(contours: typing.List, max_points: int, min_area: float) -> \
+            typing.Tuple[typing.List, typing.List[float]]:
+        """
+        Simplify raw contours to roughly max_points, and empty any smaller than min_area
+
+        :return: The new list of contours, and the seconds spent simplifying and
+            filtering by area
+        """
+        stamps = [time.perf_counter()]
         approx = list(contours)
 
-        # Simplification
-        if self._max_points > 0:
-
-            # Simplify contours based on number of points
-            num_points = sum(contour.shape[0] for contour in approx) * math.sqrt(len((approx)))
-            eps = 0.0001
-            num = 0
-            while num_points > self._max_points * 3 and eps < 0.1:
-                peris = [(cv2.arcLength(c, True) if c.size > 0 else 0) for c in approx]
-                approx = [cv2.approxPolyDP(approx[i], eps * peri, True)  if approx[i].size > 0 else approx[i] for i, peri in enumerate(peris)]
-                num_points = sum(contour.shape[0] for contour in approx) * math.sqrt(len((approx)))
-                num += 1
-                eps *= 1.1
-
-        if self._min_area > 0:
-            # Only grab contours above a certain size if there are too many
-            for i in range(len(approx)):
-                if approx[i].shape[0] < 3 or self.PolyArea(approx[i][:,0,0], approx[i][:,0,1]) < self._min_area:
-                    approx[i] = np.empty((0,1,2), dtype=np.int32)
-            
-        return approx, hierarchy
+        # Simplification
+        if max_points > 0 and approx:
+            # Busy frames get fewer points per contour
+            budget = max_points * 3 / math.sqrt(len(approx))
+            if sum(len(contour) for contour in approx) > budget:
+                approx = ContourSupplier._simplify_to_budget(approx, budget)
+        stamps.append(time.perf_counter())
+
+        if min_area > 0 and approx:
+            # Only grab contours above a certain size if there are too many
+            empty = np.empty((0, 1, 2), dtype=np.int32)
+            for i in np.flatnonzero(ContourSupplier.contour_areas(approx) < min_area).tolist():
+                approx[i] = empty
+        stamps.append(time.perf_counter())
+
+        return approx, [end - start for start, end in zip(stamps, stamps[1:])]
+
+    @staticmethod
+    def _simplify_to_budget(contours: typing.List, budget: float) -> typing.List:
+        """
+        Find the least simplification, as a fraction of each contour's perimeter, that
+        brings the contours down to a number of points
+
+        The fraction is binary searched on a log scale within SIMPLIFY_RANGE to within
+        SIMPLIFY_PRECISION, so it takes a bounded number of passes. If even the largest
+        fraction isn't enough, its contours are given anyway.
+        """
+        perimeters = [cv2.arcLength(contour, True) if len(contour) else 0.0
+                for contour in contours]
+
+        def simplify(eps: float) -> typing.Tuple[typing.List, int]:
+            simplified = [cv2.approxPolyDP(contour, eps * perimeter, True) if len(contour)
+                    else contour for contour, perimeter in zip(contours, perimeters)]
+            return simplified, sum(len(contour) for contour in simplified)
+
+        low, high = ContourSupplier.SIMPLIFY_RANGE
+        best, num_points = simplify(high)
+        if num_points > budget:
+            return best
+
+        while high / low > ContourSupplier.SIMPLIFY_PRECISION:
+            eps = math.sqrt(low * high)
+            simplified, num_points = simplify(eps)
+            if num_points > budget:
+                low = eps
+            else:
+                high, best = eps, simplified
+
+        return best
+
+    @staticmethod
+    def contour_areas(contours: typing.List) -> npt.NDArray[np.float64]:
+        """
+        Get the area of every contour at once, with 0 for any with fewer than 3 points
+        """
+        lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64,
+                count=len(contours))
+        areas = np.zeros(len(contours))
+        polygons = np.flatnonzero(lengths >= 3)
+        if len(polygons) == 0:
+            return areas
+
+        points = np.concatenate([contours[i] for i in polygons.tolist()]).reshape(-1, 2) \
+                .astype(np.float64)
+        starts = np.cumsum(lengths[polygons]) - lengths[polygons]
+
+        # Shoelace formula, with each contour's last point joined back to its first
+        following = np.arange(1, len(points) + 1)
+        following[starts + lengths[polygons] - 1] = starts
+        cross = points[:, 0] * points[following, 1] - points[:, 1] * points[following, 0]
+        areas[polygons] = np.abs(np.add.reduceat(cross, starts)) / 2
+
+        return areas
+
+    @staticmethod
+    def PolyArea(x,y):
+        return 0.5*np.abs(np.dot(x,np.roll(y,1))-np.dot(y,np.roll(x,1)))
+
+class ParallelContourSupplier:
+    """
+    A class finding the contours of a video's frames in a pool of worker processes
+
+    Frames are captured ahead into slots of shared memory, so workers read them without
+    copying, and contours come back in order. Seeking forward past frames that are
+    already being processed just drops them. Otherwise the capture is seeked like
+    ContourSupplier.seek. Frames identical to the one captured before them aren't sent
+    to the workers, and reuse its contours.
+
+    Properties
+    ----------
+    frames_discarded : int
+        The number of frames vectorized ahead but skipped by a seek
+    frames_reused : int
+        The number of frames given the previous frame's contours
+    """
+
+    _capture: ContourSupplier
+    _options: typing.Tuple[int, int, float, typing.Tuple[int, int]]
+    _profiler: typing.Optional[profiling.StageProfiler]
+    _depth: int
+    _shared_frames: shared_memory.SharedMemory
+    _slots: npt.NDArray[np.uint8]
+    _free_slots: typing.Deque[int]
+    _busy_slots: typing.Dict[int, concurrent.futures.Future]
+    _pending: typing.Deque[typing.Tuple[int, float, concurrent.futures.Future, bool]]
+    _executor: concurrent.futures.ProcessPoolExecutor
+    _last_frame: typing.Optional[npt.NDArray[np.uint8]]
+    _last_future: typing.Optional[concurrent.futures.Future]
+    _frame: int
+    _frames_discarded: int
+    _frames_reused: int
+
+    def __init__(self, source_path: pathlib.Path, jobs: int, threshold=96, max_points=-1,
+            min_area=0.0, profiler: typing.Optional[profiling.StageProfiler] = None,
+            depth: int = 0, work_width: int = 0):
+        """
+        :param int jobs: The number of worker processes
+        :param int depth: Optional, default twice the jobs. The most frames captured ahead
+        :param int work_width: Optional, default 0. The width to vectorize frames at, as
+            in ContourSupplier
+        """
+        self._capture = ContourSupplier(source_path, threshold, max_points, min_area,
+                work_width=work_width)
+        self._options = (threshold, max_points, min_area, self._capture.work_dimensions)
+        self._profiler = profiler
+        self._depth = depth if depth > 0 else 2 * max(1, jobs)
+        self._frame = 0
+        self._frames_discarded = 0
+        self._frames_reused = 0
+        self._last_frame = None
+        self._last_future = None
+        self._pending = collections.deque()
+        self._free_slots = collections.deque(range(self._depth))
+        self._busy_slots = {}
+
+        width, height = self._capture.frame_dimensions
+        self._shared_frames = shared_memory.SharedMemory(create=True,
+                size=max(1, self._depth * height * width * 3))
+        self._slots = np.ndarray((self._depth, height, width, 3), dtype=np.uint8,
+                buffer=self._shared_frames.buf)
+
+        # Workers are started right away, before any other threads exist to be forked
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=max(1, jobs),
+                initializer=_init_frame_worker,
+                initargs=(self._shared_frames, self._slots.shape, self._options))
+        self._fill()
+
+    @property
+    def framerate(self) -> float:
+        return self._capture.framerate
+
+    @property
+    def frame_count(self) -> int:
+        return self._capture.frame_count
+
+    @property
+    def frame_dimensions(self) -> typing.Tuple[int, int]:
+        return self._capture.frame_dimensions
+
+    @property
+    def work_dimensions(self) -> typing.Tuple[int, int]:
+        return self._capture.work_dimensions
+
+    @property
+    def current_frame(self) -> int:
+        return self._frame
+
+    @property
+    def frames_grabbed(self) -> int:
+        return self._capture.frames_grabbed
+
+    @property
+    def frames_seeked(self) -> int:
+        return self._capture.frames_seeked
+
+    @property
+    def seeks(self) -> int:
+        return self._capture.seeks
+
+    @property
+    def skip_time(self) -> float:
+        return self._capture.skip_time
+
+    @property
+    def frames_discarded(self) -> int:
+        return self._frames_discarded
+
+    @property
+    def frames_reused(self) -> int:
+        return self._frames_reused
+
+    def get_contours(self) -> typing.Tuple[typing.List, typing.List]:
+        self._fill()
+        if not self._pending:
+            raise EOFError("No frames left to read")
+
+        frame_num, capture_time, future, reused = self._pending.popleft()
+        approx, hierarchy, durations = future.result()
+        self._frame = frame_num + 1
+        self._fill()
+
+        if self._profiler:
+            # Reused frames were only captured and compared
+            self._profiler.add(frame_num, "capture", capture_time)
+            if not reused:
+                for stage, seconds in zip(ContourSupplier.STAGES[1:], durations):
+                    self._profiler.add(frame_num, stage, seconds)
+
+        return list(approx), hierarchy
+
+    def seek(self, new_frame: int):
+        if self._frame <= new_frame <= self._frame + len(self._pending):
+            # The frame is already on its way, so drop the ones before it
+            for i in range(new_frame - self._frame):
+                future = self._pending.popleft()[2]
+                # Unless a later frame is reusing its contours
+                if future is not self._last_future and \
+                        not (self._pending and self._pending[0][2] is future):
+                    future.cancel()
+                self._frames_discarded += 1
+        else:
+            self._frames_discarded += len(self._pending)
+            for frame_num, capture_time, future, reused in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._last_future = None
+            self._capture.seek(new_frame)
+
+        self._frame = new_frame
 
-    @staticmethod
-    def PolyArea(x,y):
-        return 0.5*np.abs(np.dot(x,np.roll(y,1))-np.dot(y,np.roll(x,1)))
+    def close(self):
+        """
+        Stop the workers and release the video and shared memory
+        """
+        for frame_num, capture_time, future, reused in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._last_future = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._busy_slots.clear()
+        self._capture.close()
+        del self._slots
+        self._shared_frames.close()
+        self._shared_frames.unlink()
+
+    def _fill(self):
+        """
+        Capture frames into free slots and hand them to the workers
+        """
+        while len(self._pending) < self._depth and \
+                self._capture.current_frame < self._capture.frame_count:
+            self._release_slots()
+            if not self._free_slots:
+                if self._pending:
+                    break
+                # Every slot is held by frames a seek dropped while they were being
+                # vectorized, which can't be cancelled, so wait for one to finish
+                concurrent.futures.wait(self._busy_slots.values(),
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                continue
+
+            frame_num = self._capture.current_frame
+            start_time = time.perf_counter()
+            try:
+                orig = self._capture.read_frame()
+            except EOFError:
+                break
+
+            if self._last_future is not None and np.array_equal(orig, self._last_frame):
+                # The workers would only find the same contours again
+                self._frames_reused += 1
+                self._pending.append((frame_num, time.perf_counter() - start_time,
+                        self._last_future, True))
+                continue
+
+            slot = self._free_slots.popleft()
+            self._slots[slot] = orig
+            capture_time = time.perf_counter() - start_time
+
+            future = self._executor.submit(_find_frame_contours, slot)
+            self._busy_slots[slot] = future
+            self._pending.append((frame_num, capture_time, future, False))
+            self._last_frame = orig
+            self._last_future = future
+
+    def _release_slots(self):
+        """
+        Free the slots of frames the workers are done with, even if nobody waits for them
+        """
+        for slot, future in list(self._busy_slots.items()):
+            if future.done():
+                del self._busy_slots[slot]
+                self._free_slots.append(slot)
 
 class VectorVideoEncoder:
     """
@@ -194,11 +1196,46 @@ class VectorVideoEncoder:
 
     _video: VectorVideo
     _encode_pointer: int
+    _write_position: int
+    _frame_offsets: array.array
+    _keyframe_interval: int
+    _point_codec: int
+    _compression: int
+    _lod_levels: typing.Tuple[float, ...]
+    _contour_keys: typing.Dict[int, typing.Tuple[VectorFrame, typing.Dict[tuple, typing.List[int]]]]
+    _stream_index: int
+    _stream_previous: typing.Optional[VectorFrame]
 
-    def __init__(self, framerate: float, dimensions: typing.Tuple[int, int]):
+    def __init__(self, framerate: float, dimensions: typing.Tuple[int, int],
+            keyframe_interval: int = 0, point_codec: str = "int32", compression: str = "none",
+            lod_levels: typing.Sequence[float] = ()):
+        """
+        :param int keyframe_interval: Optional, default 0. Every this many frames is a
+            keyframe, with the frames in between stored as changes from the previous
+            frame. 0 or 1 stores every frame in full.
+        :param str point_codec: Optional, default "int32". How points are stored, one of
+            POINT_CODECS. "int16" falls back to "int32" for frames that don't fit, and
+            "varint" stores the differences between consecutive points.
+        :param str compression: Optional, default "none". Compression applied to each
+            frame, one of COMPRESSIONS. Frames that don't shrink are left uncompressed.
+        :param lod_levels: Optional. Tolerances of extra levels of detail to store with
+            every frame, as fractions of each contour's perimeter. Contours simplified
+            below 3 points are left out of a level.
+        """
 
         self._video = VectorVideo(framerate, dimensions)
         self._encode_pointer = 0
+        self._write_position = 0
+        self._frame_offsets = array.array("Q")
+        self._keyframe_interval = max(keyframe_interval, 1)
+        self._point_codec = POINT_CODECS[point_codec]
+        self._compression = COMPRESSIONS[compression]
+        self._lod_levels = tuple(sorted(lod_levels))
+        if len(self._lod_levels) > 255:
+            raise ValueError("At most 255 extra levels of detail can be stored")
+        self._contour_keys = {}
+        self._stream_index = 0
+        self._stream_previous = None
 
     @property
     def video(self) -> VectorVideo:
@@ -207,48 +1244,317 @@ class VectorVideoEncoder:
     def feed_contours(self,
             contours: typing.List[typing.Tuple[int, typing.List[typing.Tuple[int, int]]]],
             hierarchy: npt.ArrayLike):
-        
-        frame = VectorFrame([VectorContour(self._get_color(hierarchy, i), points[:,0]) \
-                for i, points in enumerate(contours)])
 
-        self._video.append(frame)
+        self._video.append(self.build_frame(contours, hierarchy))
+
+    def build_frame(self,
+            contours: typing.List[typing.Tuple[int, typing.List[typing.Tuple[int, int]]]],
+            hierarchy: npt.ArrayLike) -> VectorFrame:
+        """
+        Convert OpenCV contours to a frame without adding it to the video
+        """
+        colors = self._get_colors(hierarchy, len(contours))
+        points = np.concatenate(contours).reshape(-1, 2) if len(contours) else ()
+        frame = VectorFrame.from_arrays(points, [len(points) for points in contours], colors)
+        return self._with_levels(frame)
+
+    @property
+    def keyframe_interval(self) -> int:
+        return self._keyframe_interval
+
+    @property
+    def lod_levels(self) -> typing.Tuple[float, ...]:
+        return self._lod_levels
+
+    def _with_levels(self, frame: VectorFrame) -> VectorFrame:
+        """
+        Get the frame with the encoder's levels of detail, building them if it's missing any
+        """
+        if frame.level_count == len(self._lod_levels) + 1:
+            return frame
+        return frame.with_levels([self._simplify(frame, tolerance)
+                for tolerance in self._lod_levels])
+
+    @staticmethod
+    def _simplify(frame: VectorFrame, tolerance: float) -> VectorFrame:
+        point_arrays = []
+        colors = []
+        for color, points in zip(frame.colors.tolist(), frame.point_arrays()):
+            if len(points) < 3:
+                continue
+            points = np.asarray(points, dtype=np.int32).reshape(-1, 1, 2)
+            points = cv2.approxPolyDP(points, tolerance * cv2.arcLength(points, True), True)
+            if len(points) >= 3:
+                point_arrays.append(points.reshape(-1, 2))
+                colors.append(color)
+
+        return VectorFrame.from_arrays(np.concatenate(point_arrays) if point_arrays else (),
+                [len(points) for points in point_arrays], colors)
+
+    def encode_frame(self, index: typing.SupportsIndex) -> bytearray:
+
+        index = range(self._video.frame_count)[index]
+        previous = self._with_levels(self._video[index - 1]) if index > 0 else None
 
-    def encode_frame(self, index: typing.SupportsIndex) -> bytes:
+        return self._encode(index, self._with_levels(self._video[index]), previous)
 
-        frame: VectorFrame = self._video[index]
+    def encode_next(self, frame: VectorFrame) -> bytearray:
+        """
+        Encode a frame following the last one passed to this method, without keeping
+        it in the video. Only the previous frame is held on to, for delta frames.
+        """
+        frame = self._with_levels(frame)
+        data = self._encode(self._stream_index, frame, self._stream_previous)
+        self._stream_index += 1
+        self._stream_previous = frame
+
+        return data
 
-        # Encode number of contours
-        data = struct.pack("<I", len(frame))
+    def _encode(self, index: int, frame: VectorFrame, previous: typing.Optional[VectorFrame]) -> \
+            bytearray:
 
-        # Encode contour data
-        for contour in frame:
-            data += self._encode_contour(contour)
+        # Each level is encoded against the same level of the previous frame
+        data = bytearray(4)
+        for level in range(frame.level_count):
+            data += self._encode_level(index, level, frame.level(level),
+                    previous.level(level) if previous is not None else None)
 
         # Encode size of frame at beginning
-        data = struct.pack("<I", len(data)) + data
+        struct.pack_into("<I", data, 0, len(data) - 4)
+
+        return data
+
+    def _encode_level(self, index: int, level: int, frame: VectorFrame,
+            previous: typing.Optional[VectorFrame]) -> bytearray:
+
+        if index % self._keyframe_interval != 0:
+            data = self._encode_delta(index, level, frame, previous)
+        else:
+            data = self._encode_contours(frame, 5)
+            data[4] = KEY_FRAME
+
+        if self._compression and len(data) > 5:
+            compressed = self._compress(data[5:])
+            if len(compressed) < len(data) - 5:
+                data = data[:5] + compressed
+                data[4] |= COMPRESSED_FRAME
+
+        struct.pack_into(LEVEL_FORMAT, data, 0, len(data) - 4)
+
+        return data
+
+    def _encode_delta(self, index: int, level: int, frame: VectorFrame,
+            previous: VectorFrame) -> bytearray:
+
+        # Contours are matched by color and shape, ignoring where they are. The keys of
+        # the last frame encoded are reused only if it really is the previous frame, as
+        # encode_frame and encode_next can be mixed.
+        last_frame, previous_keys = self._contour_keys.get(level, (None, None))
+        if last_frame is not previous:
+            previous_keys = self._group_contours(self._contour_keys_of(previous))
+        keys = self._contour_keys_of(frame)
+        self._contour_keys[level] = (frame, self._group_contours(keys))
+
+        firsts = self._first_points(frame).tolist()
+        previous_firsts = self._first_points(previous).tolist()
+        counts = frame.counts.tolist()
+
+        kinds = np.full(len(frame), CONTOUR_NEW, dtype=np.uint8)
+        refs = []
+        translations = []
+        new_contours = []
+        for i, key in enumerate(keys):
+            matches = previous_keys.get(key)
+            if not matches:
+                new_contours.append(i)
+                continue
+
+            # Prefer a contour that hasn't moved
+            ref = next((match for match in matches if counts[i] == 0 or
+                    previous_firsts[match] == firsts[i]), None)
+            if ref is not None:
+                kinds[i] = CONTOUR_UNCHANGED
+            else:
+                ref = matches[0]
+                kinds[i] = CONTOUR_TRANSLATED
+                translations.append((firsts[i][0] - previous_firsts[ref][0],
+                        firsts[i][1] - previous_firsts[ref][1]))
+            refs.append(ref)
+
+        refs = np.array(refs, dtype="<u4")
+        translations = np.array(translations, dtype="<i4").reshape(-1, 2)
+
+        # Identical frames are reduced to a single byte
+        if len(frame) == len(previous) and not new_contours and not translations.size and \
+                np.array_equal(refs, np.arange(len(previous))):
+            data = bytearray(5)
+            data[4] = REPEAT_FRAME
+            return data
+
+        head_size = 9 + kinds.nbytes + refs.nbytes + translations.nbytes
+        data = self._encode_contours(frame.subset(new_contours), head_size)
+        struct.pack_into("<BI", data, 4, DELTA_FRAME, len(frame))
+        pos = 9
+        for section in (kinds, refs, translations):
+            data[pos:pos + section.nbytes] = section.tobytes()
+            pos += section.nbytes
+
+        return data
+
+    @staticmethod
+    def _group_contours(keys: typing.List[tuple]) -> typing.Dict[tuple, typing.List[int]]:
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, []).append(i)
+
+        return groups
+
+    @staticmethod
+    def _first_points(frame: VectorFrame) -> npt.NDArray[np.int64]:
+        """
+        Get the first point of every contour, with 0, 0 for empty contours
+        """
+        if frame.point_count == 0:
+            return np.zeros((len(frame), 2), dtype=np.int64)
+        firsts = frame.points[np.minimum(frame.offsets[:-1], frame.point_count - 1)]
+        return np.where((frame.counts > 0)[:, None], firsts, 0).astype(np.int64)
+
+    @staticmethod
+    def _contour_keys_of(frame: VectorFrame) -> typing.List[tuple]:
+        """
+        Get the color and shape of every contour, where the shape is its points relative
+        to its first point
+        """
+        shapes = (frame.points - np.repeat(VectorVideoEncoder._first_points(frame),
+                frame.counts, axis=0)).astype("<i4").tobytes()
+        offsets = (frame.offsets * 8).tolist()
+        return [(color, shapes[start:end]) for color, start, end in
+                zip(frame.colors.tolist(), offsets, offsets[1:])]
+
+    def _encode_contours(self, frame: VectorFrame, head_size: int) -> bytearray:
+        """
+        Encode the contours of a frame after head_size bytes left for the caller to fill
+        """
+        colors = frame.colors
+        counts = frame.counts
+        points = frame.points.astype(np.int64)
+
+        codec = self._point_codec
+        if codec == POINT_CODECS["int16"] and points.size and \
+                (points.min() < -0x8000 or points.max() > 0x7fff):
+            codec = POINT_CODECS["int32"]
+
+        if codec == POINT_CODECS["varint"]:
+            # Each point is stored relative to the one before it, even across contours
+            deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), np.int64))
+            stream = _encode_varints(np.concatenate((counts.astype(np.uint64),
+                    _zigzag_encode(deltas.reshape(-1)))))
+            sections = (colors, np.array([len(stream)], dtype="<u4"), stream)
+        else:
+            sections = (colors, counts.astype("<u4"), points.astype(POINT_DTYPES[codec]))
+
+        data = bytearray(head_size + 5 + sum(section.nbytes for section in sections))
+        struct.pack_into("<BI", data, head_size, codec, len(frame))
+        pos = head_size + 5
+        for section in sections:
+            data[pos:pos + section.nbytes] = section.tobytes()
+            pos += section.nbytes
 
         return data
 
+    def _compress(self, data: bytearray) -> bytes:
+        if self._compression == COMPRESSIONS["zlib"]:
+            return zlib.compress(data)
+        return lzma.compress(data)
+
     def encode_headers(self) -> bytes:
-        return struct.pack("<IfII", FILE_VERSIONS[-1], self._video.framerate,
-                self._video.dimensions[0], self._video.dimensions[1])
+        return struct.pack("<IfIIIBBB", FILE_VERSIONS[-1], self._video.framerate,
+                self._video.dimensions[0], self._video.dimensions[1], self._keyframe_interval,
+                self._point_codec, self._compression, len(self._lod_levels)) + \
+                np.array(self._lod_levels, dtype="<f4").tobytes()
+
+    def encode_index(self) -> bytes:
+        return np.asarray(self._frame_offsets, dtype="<u8").tobytes() + \
+                struct.pack(INDEX_TRAILER_FORMAT, len(self._frame_offsets), INDEX_MAGIC)
 
     def dump_continue(self, buffer: BufferedWriter):
-        if self._encode_pointer == 0:
-            buffer.write(self.encode_headers())
-        for i in range(self._encode_pointer, self._video.frame_count):
-            buffer.write(self.encode_frame(i))
-            self._encode_pointer = i + 1
+        if self._write_position == 0:
+            self._write_headers(buffer)
+        self._write_frames(buffer, [self.encode_frame(i)
+                for i in range(self._encode_pointer, self._video.frame_count)])
+        self._encode_pointer = self._video.frame_count
+
+    def dump_next(self, buffer: BufferedWriter, frame: VectorFrame):
+        """
+        Encode and write a frame without keeping it. See encode_next
+        """
+        self.dump_encoded(buffer, (self.encode_next(frame),))
+
+    def dump_encoded(self, buffer: BufferedWriter, encoded_frames: typing.Iterable[bytes]):
+        """
+        Write frames that were already encoded (such as by another process) after the
+        frames written so far
+        """
+        if self._write_position == 0:
+            self._write_headers(buffer)
+        self._write_frames(buffer, encoded_frames)
+
+    def dump_index(self, buffer: BufferedWriter):
+        """
+        Finish a file written with dump_continue or dump_encoded by writing the frame index
+        """
+        if self._write_position == 0:
+            self._write_headers(buffer)
+        buffer.write(self.encode_index())
 
     def dump(self, buffer: BufferedWriter):
-        buffer.write(self.encode_headers())
-        for i in range(self._video.frame_count):
-            buffer.write(self.encode_frame(i))
+        self._write_position = 0
+        self._frame_offsets = array.array("Q")
+        self._write_headers(buffer)
+        self._write_frames(buffer, (self.encode_frame(i) for i in range(self._video.frame_count)))
+        buffer.write(self.encode_index())
+
+    def _write_headers(self, buffer: BufferedWriter):
+        data = self.encode_headers()
+        buffer.write(data)
+        self._write_position = len(data)
+
+    def _write_frames(self, buffer: BufferedWriter, encoded_frames: typing.Iterable[bytes]):
+        buffer.writelines(self._track_offsets(encoded_frames))
+
+    def _track_offsets(self, encoded_frames: typing.Iterable[bytes]) -> typing.Iterator[bytes]:
+        for data in encoded_frames:
+            self._frame_offsets.append(self._write_position)
+            self._write_position += len(data)
+            yield data
 
     def trim_dumped(self):
-        for i in range(self._encode_pointer):
+        # The last dumped frame is kept since the next frame may be encoded against it
+        for i in range(self._encode_pointer - 1):
             self._video[i] = VectorFrame()
 
+    @staticmethod
+    def _get_colors(hierarchy: typing.Optional[npt.ArrayLike], num_contours: int) -> \
+            npt.NDArray[np.uint8]:
+        """
+        Get the color of every contour at once, which is the parity of its nesting depth
+        """
+        if hierarchy is None or num_contours == 0:
+            return np.zeros(num_contours, dtype=np.uint8)
+
+        # Pointer jumping: each pass adds the depth of the ancestor being pointed at and
+        # then points at that ancestor's ancestor, so it takes log2(depth) passes
+        ancestors = np.array(hierarchy[0,:num_contours,3], dtype=np.int64)
+        depths = (ancestors != -1).astype(np.int64)
+        has_ancestor = ancestors != -1
+        while has_ancestor.any():
+            targets = ancestors[has_ancestor]
+            depths[has_ancestor] += depths[targets]
+            ancestors[has_ancestor] = ancestors[targets]
+            has_ancestor = ancestors != -1
+
+        return (depths & 1).astype(np.uint8)
+
     @staticmethod
     def _get_color(hierarchy: npt.ArrayLike, index: typing.SupportsIndex):
         parent = hierarchy[0,index,3]
@@ -259,11 +1565,105 @@ class VectorVideoEncoder:
 
         return color
 
-    @staticmethod
-    def _encode_contour(contour: VectorContour) -> bytes:
-        # Encode color, number of points, and point data
-        return struct.pack(f"<BI{2*len(contour)}i", contour.color, len(contour),
-                *(scalar for point in contour for scalar in point))
+class BackgroundVectorWriter:
+    """
+    A class handling writing of vector files on a background thread
+
+    Frames are passed through a bounded queue to a thread that encodes and writes them,
+    so disk writes overlap with vectorizing and no frames are kept once written.
+    Errors from the thread are raised by the next call to write or close.
+    """
+
+    _buffer: BufferedWriter
+    _encoder: VectorVideoEncoder
+    _queue: queue.Queue
+    _thread: threading.Thread
+    _error: typing.Optional[BaseException]
+    _frames_written: int
+    _frames_queued: int
+    _profiler: typing.Optional[profiling.StageProfiler]
+    _start_frame: int
+
+    def __init__(self, buffer: BufferedWriter, encoder: VectorVideoEncoder, queue_size: int = 16,
+            profiler: typing.Optional[profiling.StageProfiler] = None, start_frame: int = 0):
+        """
+        :param profiler: Optional. Records the time spent encoding and writing each frame
+        :param int start_frame: Optional, default 0. The source frame number of the first
+            frame written, which the profiler records times under when frames are written
+            without their numbers
+        """
+
+        self._buffer = buffer
+        self._encoder = encoder
+        self._profiler = profiler
+        self._start_frame = start_frame
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._frames_written = 0
+        self._frames_queued = 0
+        self._thread = threading.Thread(target=self._run, name="vector-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def frames_written(self) -> int:
+        return self._frames_written
+
+    def write(self, frame: VectorFrame, frame_num: typing.Optional[int] = None):
+        """
+        Queue a frame to be written, waiting if the queue is full
+
+        :param frame_num: Optional. The source frame number the profiler records times
+            under, defaulting to the frame after the last one queued
+        """
+        self._raise_error()
+        if frame_num is None:
+            frame_num = self._start_frame + self._frames_queued
+        self._queue.put((frame_num, frame))
+        self._frames_queued += 1
+
+    def close(self):
+        """
+        Write the remaining frames and the frame index, then stop the thread
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _run(self):
+        finished = False
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    finished = True
+                    break
+                frame_num, frame = item
+                if self._profiler:
+                    with self._profiler.time(frame_num, "encode"):
+                        data = self._encoder.encode_next(frame)
+                    with self._profiler.time(frame_num, "write"):
+                        self._encoder.dump_encoded(self._buffer, (data,))
+                else:
+                    self._encoder.dump_next(self._buffer, frame)
+                self._frames_written += 1
+            self._encoder.dump_index(self._buffer)
+        except BaseException as error:
+            self._error = error
+            # Keep draining so writers waiting on a full queue don't block forever
+            while not finished:
+                finished = self._queue.get() is None
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
 
 class VectorVideoDecoder:
     """
@@ -336,14 +1736,53 @@ class VectorVideoFileDecoder(VectorVideoDecoder):
     _file_path: pathlib.Path
     _file_object: BufferedReader
     _file_size: int
+    _file_version: int
     _header_size: int
+    _data_end: int
+    _frame_offsets: npt.NDArray[np.uint64]
     _point_dtype: str
-
-    def __init__(self, vector_file_path: pathlib.Path):
+    _keyframe_interval: int
+    _compression: int
+    _lod_levels: typing.Tuple[float, ...]
+    _reference: typing.Optional[VectorFrame]
+    _reference_num: int
+    _cache: FrameCache
+    _profiler: typing.Optional[profiling.StageProfiler]
+
+    def __init__(self, vector_file_path: pathlib.Path, cache_frames: int = 256,
+            cache_bytes: int = 0, profiler: typing.Optional[profiling.StageProfiler] = None):
+        """
+        :param int cache_frames: Optional, default 256. The most decoded frames to keep.
+        :param int cache_bytes: Optional, default 0. The most bytes of decoded points to
+            keep, or 0 for no limit.
+        :param profiler: Optional. Records the time spent decoding each frame read
+        """
 
         super().__init__()
         self._file_path = vector_file_path
+        self._profiler = profiler
         self._file_object = None
+        self._reference = None
+        self._reference_num = -1
+        self._cache = FrameCache(cache_frames, cache_bytes)
+
+    @property
+    def cache(self) -> FrameCache:
+        return self._cache
+
+    @property
+    def lod_levels(self) -> typing.Tuple[float, ...]:
+        """
+        The tolerances of the levels of detail stored after the full frame
+        """
+        return self._lod_levels
+
+    @property
+    def index_path(self) -> pathlib.Path:
+        """
+        The sidecar index used for files without an index footer
+        """
+        return self._file_path.with_name(self._file_path.name + ".idx")
 
     def _get_headers(self):
         if self._file_object:
@@ -355,15 +1794,37 @@ class VectorVideoFileDecoder(VectorVideoDecoder):
 
             if file_version == 1:
                 self._point_dtype = "<f4"
-            elif file_version == 2:
+            else:
                 self._point_dtype = "<i4"
 
+            self._file_version = file_version
             self._header_size = struct.calcsize("<IfII")
             self._file_size = self._file_path.stat().st_size
             self._framerate, width, height = self._get_data("<fII")
             self._dimensions = (width, height)
-            self._total_frames = self._count_frames()
-            self._vector_video = VectorVideo(self._framerate, self._dimensions)
+
+            self._keyframe_interval = 1
+            if file_version >= 4:
+                self._keyframe_interval, = self._get_data("<I")
+                self._header_size += 4
+
+            self._compression = COMPRESSIONS["none"]
+            if file_version >= 5:
+                point_codec, self._compression = self._get_data("<BB")
+                self._header_size += 2
+
+            self._lod_levels = ()
+            if file_version >= 6:
+                num_levels, = self._get_data("<B")
+                self._lod_levels = self._get_data(f"<{num_levels}f")
+                self._header_size += 1 + 4 * num_levels
+
+            self._frame_offsets = self._load_index()
+            self._total_frames = len(self._frame_offsets)
+            self._reference = None
+            self._reference_num = -1
+            self._cache.clear()
+            self._vector_video = LazyVectorVideo(self)
 
     def open(self):
         """
@@ -401,29 +1862,40 @@ class VectorVideoFileDecoder(VectorVideoDecoder):
                 List of Points:
                     Point (tuple[float, float])
         """
-        if self._frame < len(self._vector_video):
-            frame = self._vector_video[self._frame]
-        else:
-            frame_size, num_contours = self._get_data("<II")
-            contours = []
-            for contour_num in range(num_contours):
-                color, num_points = self._get_data("<BI")
-                points = np.frombuffer(self._file_object.read(
-                        struct.calcsize(f"<{num_points*2}i")), dtype=self._point_dtype)
-                points.shape = (num_points, 2)
-                contour = VectorContour(color, points)
-                contours.append(contour)
-
-            frame = VectorFrame(contours)
-            self._vector_video.insert(self._frame, frame)
-
+        frame = self.frame(self._frame)
         self._frame += 1
 
         return frame
 
+    def frame(self, frame_num: int) -> VectorFrame:
+        """
+        Get a specific frame through the cache without moving the pointer
+
+        :param int frame_num: The frame number to get
+        :return: The decoded vectorized frame
+        """
+        frame = self._cache.get(frame_num)
+        if frame is None:
+            if self._profiler:
+                with self._profiler.time(frame_num, "decode"):
+                    frame = self._load_frame(frame_num)
+            else:
+                frame = self._load_frame(frame_num)
+            self._cache.put(frame_num, frame)
+
+        return frame
+
     def read_all(self) -> VectorVideo:
-        while self._frame < self._total_frames:
-            self.read()
+        """
+        Decode every frame in the file, regardless of the cache limits
+
+        :return: The whole decoded video
+        """
+        self._vector_video = VectorVideo(self._framerate, self._dimensions)
+        for frame_num in range(self._total_frames):
+            frame = self._cache.get(frame_num)
+            self._vector_video.append(frame if frame is not None else self._load_frame(frame_num))
+        self._frame = self._total_frames
 
         return self._vector_video
 
@@ -436,30 +1908,18 @@ class VectorVideoFileDecoder(VectorVideoDecoder):
             1 is seek relative to current pointer. 2 is seek relative to end of video.
         """
         if whence == 0:
-            relative_offset = frame_offset - self._frame
             frame_num = frame_offset
         elif whence == 1:
-            relative_offset = frame_offset
-            frame_num = self._frame + relative_offset
+            frame_num = self._frame + frame_offset
         elif whence == 2:
-            relative_offset = self._total_frames - frame_offset
-            frame_num = self._frame + relative_offset
+            frame_num = self._total_frames - frame_offset
         else:
             raise ValueError(f"invalid whence ({whence}, should be 0, 1 or 2)")
 
-        # Seek to beginning if frame is before current frame
-        if relative_offset < 0:
-            self._file_object.seek(self._header_size)
-            relative_offset = frame_num
-
-        for i in range(relative_offset):
-            frame_size, = self._get_data("<I")
-            self._file_object.seek(frame_size, 1)
-
-        self._frame = frame_num
+        # Frames are located through the index when read, so only the pointer moves
+        self._frame = min(max(frame_num, 0), self._total_frames)
 
-    def read_specific(self, frame_num: int) -> \
-            typing.List[typing.Tuple[int, typing.List[typing.Tuple[float, float]]]]:
+    def read_specific(self, frame_num: int) -> VectorFrame:
         """
         Read a specific frame within the vector file without moving the pointer.
         See the read method
@@ -467,20 +1927,165 @@ class VectorVideoFileDecoder(VectorVideoDecoder):
         :param int frame_num: The frame number to read
         :return: The decoded vectorized frame
         """
+        return self._load_frame(frame_num)
+
+    def _load_frame(self, frame_num: int) -> VectorFrame:
+        """
+        Decode a frame along with any frames since the last keyframe it depends on
+        """
+        if frame_num >= self._total_frames:
+            raise EOFError("No frames left to read")
+
+        if frame_num == self._reference_num:
+            return self._reference
+
+        # Continue from the last decoded frame when it's in the same group of frames
+        start_frame = frame_num - frame_num % self._keyframe_interval
+        if start_frame <= self._reference_num < frame_num:
+            start_frame = self._reference_num + 1
+
+        for num in range(start_frame, frame_num + 1):
+            data, offset = self._read_record(num)
+            self._reference = self._decode_frame(data, offset, self._reference)
+            self._reference_num = num
+
+        return self._reference
+
+    def _read_record(self, frame_num: int) -> typing.Tuple[typing.Union[bytes, memoryview], int]:
+        """
+        Get a buffer holding a frame, and the offset of the frame in it after its size
+        """
+        self._file_object.seek(int(self._frame_offsets[frame_num]))
+        frame_size, = self._get_data("<I")
+        return self._file_object.read(frame_size), 0
+
+    def _decode_frame(self, data: typing.Union[bytes, memoryview], offset: int = 0,
+            previous: typing.Optional[VectorFrame] = None) -> VectorFrame:
+        """
+        Decode the frame stored at offset in data (just after its size prefix). Point
+        arrays are views into data rather than copies, except for moved contours.
+        """
+        if self._file_version < 6:
+            return self._decode_level(data, offset, previous)
 
-        # Find current position to return to
-        previous_byte = self._file_object.tell()
-        previous_frame = self._frame
+        levels = []
+        for level in range(len(self._lod_levels) + 1):
+            level_size, = struct.unpack_from(LEVEL_FORMAT, data, offset)
+            offset += 4
+            levels.append(self._decode_level(memoryview(data)[offset:offset + level_size], 0,
+                    previous.level(level) if previous is not None else None))
+            offset += level_size
 
-        # Seek and read frame
-        self.seek(frame_num)
-        frame_data = self.read()
+        return levels[0].with_levels(levels[1:])
+
+    def _decode_level(self, data: typing.Union[bytes, memoryview], offset: int,
+            previous: typing.Optional[VectorFrame]) -> VectorFrame:
+        """
+        Decode a single level of a frame, which makes up the whole frame before version 6
+        """
+        if self._file_version < 4:
+            return self._decode_contours(data, offset)
+
+        frame_type = data[offset]
+        offset += 1
+
+        if frame_type & COMPRESSED_FRAME:
+            data = self._decompress(data[offset:])
+            frame_type &= ~COMPRESSED_FRAME
+            offset = 0
+
+        if frame_type == KEY_FRAME:
+            return self._decode_contours(data, offset)
+        elif frame_type == REPEAT_FRAME:
+            return previous
+        elif frame_type != DELTA_FRAME:
+            raise TypeError(f"Invalid frame type '{frame_type}'.")
+
+        num_contours, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        kinds = np.frombuffer(data, dtype=np.uint8, count=num_contours, offset=offset)
+        offset += kinds.nbytes
+        refs = np.frombuffer(data, dtype="<u4", count=int((kinds != CONTOUR_NEW).sum()),
+                offset=offset)
+        offset += refs.nbytes
+        translations = np.frombuffer(data, dtype="<i4",
+                count=2 * int((kinds == CONTOUR_TRANSLATED).sum()), offset=offset).reshape(-1, 2)
+        offset += translations.nbytes
+        new_contours = self._decode_contours(data, offset)
+
+        # Gather every contour's points from the previous frame or the new contours
+        is_new = kinds == CONTOUR_NEW
+        sources = np.empty(num_contours, dtype=np.int64)
+        sources[~is_new] = refs
+        sources[is_new] = np.arange(len(new_contours)) + len(previous)
+        counts = np.concatenate((previous.counts, new_contours.counts))[sources]
+        starts = np.concatenate((previous.offsets[:-1],
+                new_contours.offsets[:-1] + previous.point_count))[sources]
+        colors = np.concatenate((previous.colors, new_contours.colors))[sources]
+
+        pool = np.concatenate((previous.points, new_contours.points))
+        offsets = VectorFrame._offsets_of(counts)
+        points = pool[np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])]
+
+        if len(translations):
+            shifts = np.zeros((num_contours, 2), dtype=np.int64)
+            shifts[kinds == CONTOUR_TRANSLATED] = translations
+            points = points + np.repeat(shifts, counts, axis=0)
+
+        return VectorFrame.from_arrays(points, counts, colors)
+
+    def _decode_contours(self, data: typing.Union[bytes, memoryview], offset: int) -> VectorFrame:
+        if self._file_version >= 5:
+            return self._decode_contour_arrays(data, offset)
+
+        num_contours, = struct.unpack_from("<I", data, offset)
+        offset += 4
+
+        point_arrays = []
+        colors = []
+        for contour_num in range(num_contours):
+            color, num_points = struct.unpack_from("<BI", data, offset)
+            offset += 5
+            points = np.frombuffer(data, dtype=self._point_dtype, count=num_points * 2,
+                    offset=offset).reshape(num_points, 2)
+            offset += points.nbytes
+            point_arrays.append(points)
+            colors.append(color)
+
+        # The points of each contour are separated by its header, so they stay as views
+        return VectorFrame.from_views(point_arrays, colors)
+
+    def _decode_contour_arrays(self, data: typing.Union[bytes, memoryview], offset: int) -> \
+            VectorFrame:
+        codec, num_contours = struct.unpack_from("<BI", data, offset)
+        offset += 5
+        colors = np.frombuffer(data, dtype=np.uint8, count=num_contours, offset=offset)
+        offset += colors.nbytes
+
+        if codec == POINT_CODECS["varint"]:
+            stream_size, = struct.unpack_from("<I", data, offset)
+            offset += 4
+            values = _decode_varints(np.frombuffer(data, dtype=np.uint8, count=stream_size,
+                    offset=offset))
+            counts = values[:num_contours].astype(np.int64)
+            points = np.cumsum(_zigzag_decode(values[num_contours:]).reshape(-1, 2),
+                    axis=0).astype(np.int32)
+        elif codec in POINT_DTYPES:
+            counts = np.frombuffer(data, dtype="<u4", count=num_contours, offset=offset)
+            offset += counts.nbytes
+            points = np.frombuffer(data, dtype=POINT_DTYPES[codec], count=2 * int(counts.sum()),
+                    offset=offset).reshape(-1, 2)
+        else:
+            raise TypeError(f"Invalid point codec '{codec}'.")
 
-        # Return to last position
-        self._file_object.seek(previous_byte)
-        self._frame = previous_frame
+        return VectorFrame.from_arrays(points, counts, colors)
 
-        return frame_data
+    def _decompress(self, data: typing.Union[bytes, memoryview]) -> bytes:
+        if self._compression == COMPRESSIONS["zlib"]:
+            return zlib.decompress(data)
+        elif self._compression == COMPRESSIONS["lzma"]:
+            return lzma.decompress(data)
+        raise TypeError(f"Invalid compression '{self._compression}'.")
 
     def _get_data(self, format: str) -> typing.Tuple:
         size = struct.calcsize(format)
@@ -489,34 +2094,164 @@ class VectorVideoFileDecoder(VectorVideoDecoder):
             return struct.unpack(format, data)
         return ()
 
-    def _count_frames(self) -> int:
+    def _load_index(self) -> npt.NDArray[np.uint64]:
+        """
+        Find the byte offset of every frame, using the index footer of version 3+ files
+        or a sidecar index (built on first open) for anything else
+        """
+        frame_offsets = None
+        if self._file_version >= 3:
+            frame_offsets = self._read_index_footer()
+
+        if frame_offsets is None:
+            self._data_end = self._file_size
+            frame_offsets = self._read_sidecar_index()
+
+        if frame_offsets is None:
+            frame_offsets = self._scan_frame_offsets()
+            self._write_sidecar_index(frame_offsets)
+
+        return frame_offsets
+
+    def _read_index_footer(self) -> typing.Optional[npt.NDArray[np.uint64]]:
+        trailer_size = struct.calcsize(INDEX_TRAILER_FORMAT)
+        if self._file_size < self._header_size + trailer_size:
+            return None
+
+        last_pos = self._file_object.tell()
+        self._file_object.seek(self._file_size - trailer_size)
+        num_frames, magic = self._get_data(INDEX_TRAILER_FORMAT)
+
+        index_start = self._file_size - trailer_size - num_frames * 8
+        if magic != INDEX_MAGIC or index_start < self._header_size:
+            self._file_object.seek(last_pos)
+            return None
+
+        self._file_object.seek(index_start)
+        frame_offsets = np.frombuffer(self._file_object.read(num_frames * 8), dtype="<u8")
+        self._file_object.seek(last_pos)
+
+        if not self._valid_offsets(frame_offsets, index_start):
+            return None
+
+        self._data_end = index_start
+        return frame_offsets
+
+    def _read_sidecar_index(self) -> typing.Optional[npt.NDArray[np.uint64]]:
+        try:
+            with self.index_path.open("rb") as index_file:
+                header = index_file.read(struct.calcsize(SIDECAR_INDEX_FORMAT))
+                magic, file_size, file_mtime, num_frames = \
+                        struct.unpack(SIDECAR_INDEX_FORMAT, header)
+                frame_offsets = np.frombuffer(index_file.read(num_frames * 8), dtype="<u8")
+        except (OSError, struct.error):
+            return None
+
+        # Only trust the index if it was built from this exact file
+        stat = self._file_path.stat()
+        if magic != INDEX_MAGIC or file_size != stat.st_size or file_mtime != stat.st_mtime_ns \
+                or not self._valid_offsets(frame_offsets, self._data_end):
+            return None
+
+        return frame_offsets
+
+    def _write_sidecar_index(self, frame_offsets: npt.NDArray[np.uint64]):
+        stat = self._file_path.stat()
+        try:
+            with self.index_path.open("wb") as index_file:
+                index_file.write(struct.pack(SIDECAR_INDEX_FORMAT, INDEX_MAGIC, stat.st_size,
+                        stat.st_mtime_ns, len(frame_offsets)))
+                index_file.write(frame_offsets.astype("<u8").tobytes())
+        except OSError:
+            # The index is only an optimization, so read-only locations are fine
+            pass
+
+    def _valid_offsets(self, frame_offsets: npt.NDArray[np.uint64], data_end: int) -> bool:
+        if len(frame_offsets) == 0:
+            return True
+        return frame_offsets[0] == self._header_size and frame_offsets[-1] < data_end and \
+                bool(np.all(np.diff(frame_offsets.astype(np.int64)) > 0))
+
+    def _scan_frame_offsets(self) -> npt.NDArray[np.uint64]:
         last_pos = self._file_object.tell()
         self._file_object.seek(self._header_size)
         pos = self._header_size
-        frame_size = 0
-        num_frames = 0
-        while pos + frame_size < self._file_size:
+        frame_offsets = []
+        while pos + 4 <= self._data_end:
             frame_size, = self._get_data("<I")
-            pos += 4
-            self._file_object.seek(frame_size, 1)
-            num_frames += 1
-            pos += frame_size
+            frame_offsets.append(pos)
+            pos += 4 + frame_size
+            self._file_object.seek(pos)
 
         self._file_object.seek(last_pos)
 
-        return num_frames
+        return np.array(frame_offsets, dtype="<u8")
+
+class VectorVideoMmapDecoder(VectorVideoFileDecoder):
+    """
+    A class handling decoding of vectorized videos from memory-mapped files
+
+    Frames are decoded straight out of the mapping, so contour points are read-only
+    views into the file rather than copies. Views stay valid after the decoder is
+    closed; the mapping is released once the last of them is gone. Delta frames are
+    gathered from the contours they reuse into new arrays, as are compressed frames and
+    varint points, which have to be decoded.
+    """
+
+    _mapping: mmap.mmap
+
+    def __init__(self, vector_file_path: pathlib.Path, cache_frames: int = 256,
+            cache_bytes: int = 0, profiler: typing.Optional[profiling.StageProfiler] = None):
+
+        super().__init__(vector_file_path, cache_frames, cache_bytes, profiler)
+        self._mapping = None
+
+    def open(self):
+        """
+        Open and map the vector file for reading
+        """
+        super().open()
+        self._mapping = mmap.mmap(self._file_object.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """
+        Unmap and close the vector file
+        """
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # Frames still reference the mapping, let them keep it alive
+                pass
+            self._mapping = None
+        super().close()
+
+    def _read_record(self, frame_num: int) -> typing.Tuple[memoryview, int]:
+        # Slice out just the frame so compressed payloads don't run into the next frames
+        start = int(self._frame_offsets[frame_num]) + 4
+        frame_size, = struct.unpack_from("<I", self._mapping, start - 4)
+        return memoryview(self._mapping)[start:start + frame_size], 0
 
 class VectorVideoLiveDecoder(VectorVideoDecoder):
+    """
+    A class handling live vectorization of videos
+
+    Decoded frames are kept in the encoder's video, unless a writer is given, in which
+    case they are streamed to it instead and memory use stays constant.
+    """
 
     _vector_encoder: VectorVideoEncoder
     _contour_supplier: ContourSupplier
+    _writer: typing.Optional[BackgroundVectorWriter]
 
-    def __init__(self, contour_supplier: ContourSupplier):
+    def __init__(self, contour_supplier: ContourSupplier,
+            writer: typing.Optional[BackgroundVectorWriter] = None, **encoder_options):
 
         super().__init__()
         self._vector_encoder = VectorVideoEncoder(contour_supplier.framerate,
-                contour_supplier.frame_dimensions)
+                contour_supplier.frame_dimensions, **encoder_options)
         self._contour_supplier = contour_supplier
+        self._writer = writer
         
     @property
     def current_frame(self) -> int:
@@ -552,6 +2287,339 @@ class VectorVideoLiveDecoder(VectorVideoDecoder):
         else:
             raise ValueError("Whence must be 1, 2 or 3")
 
-    def read(self) -> typing.List[typing.Tuple[int, typing.List[typing.Tuple[float, float]]]]:
-        self._vector_encoder.feed_contours(*self._contour_supplier.get_contours())
-        return self._vector_encoder.video[-1]
\ No newline at end of file
+    @property
+    def writer(self) -> typing.Optional[BackgroundVectorWriter]:
+        return self._writer
+
+    def read(self) -> VectorFrame:
+        frame_num = self._contour_supplier.current_frame
+        frame = self.vectorize()
+        self.keep(frame, frame_num)
+        return frame
+
+    def vectorize(self) -> VectorFrame:
+        """
+        Vectorize the next frame without keeping it, see keep
+        """
+        return self._vector_encoder.build_frame(*self._contour_supplier.get_contours())
+
+    def keep(self, frame: VectorFrame, frame_num: typing.Optional[int] = None):
+        """
+        Write a vectorized frame to the writer, or add it to the video without one
+
+        :param frame_num: Optional. The source frame number, which the writer's timings
+            are recorded under
+        """
+        if self._writer:
+            self._writer.write(frame, frame_num)
+        else:
+            self._vector_encoder.video.append(frame)
+
+class VectorVideoPrefetchDecoder(VectorVideoDecoder):
+    """
+    A class that decodes frames ahead of time on a background thread
+
+    Wraps another decoder and keeps up to `depth` upcoming frames ready. Seeking forward
+    drops buffered frames that were skipped, and frames that weren't decoded yet are
+    jumped over rather than decoded and thrown away. Live frames are only written or
+    kept once they're read, so skipped frames never end up in the output.
+    """
+
+    _decoder: VectorVideoDecoder
+    _depth: int
+    _end_frame: int
+    _buffer: typing.Deque[typing.Tuple[int, VectorFrame]]
+    _position: int
+    _generation: int
+    _running: bool
+    _error: typing.Optional[BaseException]
+    _condition: threading.Condition
+    _thread: threading.Thread
+
+    def __init__(self, decoder: VectorVideoDecoder, depth: int = 8, end_frame: int = -1):
+        """
+        :param int depth: Optional, default 8. The most frames to decode ahead
+        :param int end_frame: Optional, default the end of the video. The frame to stop
+            decoding at
+        """
+
+        super().__init__()
+        self._decoder = decoder
+        self._depth = max(1, depth)
+        self._end_frame = end_frame if 0 <= end_frame <= decoder.total_frames \
+                else decoder.total_frames
+        self._buffer = collections.deque()
+        self._frame = decoder.current_frame
+        self._position = self._frame
+        self._generation = 0
+        self._running = True
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="vector-prefetch", daemon=True)
+        self._thread.start()
+
+    @property
+    def dimensions(self) -> typing.Tuple[int, int]:
+        return self._decoder.dimensions
+
+    @property
+    def framerate(self) -> float:
+        return self._decoder.framerate
+
+    @property
+    def total_frames(self) -> int:
+        return self._decoder.total_frames
+
+    @property
+    def video(self) -> VectorVideo:
+        return self._decoder.video
+
+    @property
+    def decoder(self) -> VectorVideoDecoder:
+        return self._decoder
+
+    def read(self) -> VectorFrame:
+        with self._condition:
+            while not self._buffer or self._buffer[0][0] != self._frame:
+                if self._error is not None:
+                    raise self._error
+                if self._frame >= self._end_frame:
+                    raise EOFError("No frames left to read")
+                self._condition.wait()
+
+            frame_num, frame = self._buffer.popleft()
+            self._frame += 1
+            self._condition.notify_all()
+
+        if isinstance(self._decoder, VectorVideoLiveDecoder):
+            self._decoder.keep(frame, frame_num)
+
+        return frame
+
+    def seek(self, frame_offset: int, whence: int = 0):
+        with self._condition:
+            if whence == 0:
+                frame_num = frame_offset
+            elif whence == 1:
+                frame_num = self._frame + frame_offset
+            elif whence == 2:
+                frame_num = self.total_frames - frame_offset
+            else:
+                raise ValueError(f"invalid whence ({whence}, should be 0, 1 or 2)")
+
+            if self._frame <= frame_num <= self._position:
+                # Already decoded, so just drop the frames before it
+                while self._buffer and self._buffer[0][0] < frame_num:
+                    self._buffer.popleft()
+            else:
+                # Restart decoding there, discarding anything currently being decoded
+                self._buffer.clear()
+                self._position = frame_num
+                self._generation += 1
+
+            self._frame = frame_num
+            self._condition.notify_all()
+
+    def close(self):
+        """
+        Stop the prefetch thread and close the wrapped decoder if it can be closed
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+        if hasattr(self._decoder, "close"):
+            self._decoder.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (len(self._buffer) >= self._depth or
+                        self._position >= self._end_frame or self._error is not None):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                frame_num = self._position
+                generation = self._generation
+
+            try:
+                if self._decoder.current_frame != frame_num:
+                    self._decoder.seek(frame_num)
+                if isinstance(self._decoder, VectorVideoLiveDecoder):
+                    frame = self._decoder.vectorize()
+                else:
+                    frame = self._decoder.read()
+            except BaseException as error:
+                with self._condition:
+                    self._error = error
+                    self._condition.notify_all()
+                continue
+
+            with self._condition:
+                if generation == self._generation:
+                    self._buffer.append((frame_num, frame))
+                    self._position = frame_num + 1
+                self._condition.notify_all()
+
+class ParallelVectorExporter:
+    """
+    A class handling export of vector files using a pool of worker processes
+
+    The frame range is split into chunks which are vectorized and encoded by separate
+    processes, each with its own video capture. Chunks are written in order, so the
+    output is identical to encoding every frame serially.
+    """
+
+    _source_path: pathlib.Path
+    _supplier_options: dict
+    _encoder_options: dict
+    _jobs: int
+    _chunk_size: int
+    _framerate: float
+    _dimensions: typing.Tuple[int, int]
+    _frame_count: int
+
+    def __init__(self, source_path: pathlib.Path, jobs: int, chunk_size: int = 64,
+            encoder_options: typing.Optional[dict] = None, **supplier_options):
+
+        self._source_path = source_path
+        self._supplier_options = supplier_options
+        self._encoder_options = encoder_options or {}
+        self._jobs = max(1, jobs)
+
+        # Chunks start on keyframes so workers never need frames from another chunk
+        keyframe_interval = max(1, self._encoder_options.get("keyframe_interval", 0))
+        self._chunk_size = -(-max(1, chunk_size) // keyframe_interval) * keyframe_interval
+
+        source = cv2.VideoCapture(str(source_path))
+        self._framerate = source.get(cv2.CAP_PROP_FPS)
+        self._frame_count = int(source.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._dimensions = (int(source.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(source.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        source.release()
+
+    @property
+    def framerate(self) -> float:
+        return self._framerate
+
+    @property
+    def frame_count(self) -> int:
+        return self._frame_count
+
+    @property
+    def dimensions(self) -> typing.Tuple[int, int]:
+        return self._dimensions
+
+    def export(self, buffer: BufferedWriter, start_frame: int = 0, end_frame: int = -1,
+            progress: typing.Optional[typing.Callable[[int], None]] = None) -> int:
+        """
+        Vectorize and encode a frame range into a vector file
+
+        :param buffer: The writable file to encode into
+        :param int start_frame: The first frame to encode
+        :param int end_frame: The frame to stop before. Negative means end of video.
+        :param progress: Optional callback receiving the number of frames written so far
+        :return: The number of frames written
+        """
+        if end_frame < 0 or end_frame > self._frame_count:
+            end_frame = self._frame_count
+
+        encoder = VectorVideoEncoder(self._framerate, self._dimensions, **self._encoder_options)
+
+        chunks = [(start, min(start + self._chunk_size, end_frame))
+                for start in range(start_frame, end_frame, self._chunk_size)]
+
+        frames_written = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self._jobs) as executor:
+
+            # Keep a bounded window of chunks in flight so finished chunks don't pile up
+            pending = collections.deque()
+            chunk_iter = iter(chunks)
+            for chunk in chunk_iter:
+                pending.append(executor.submit(_encode_frame_chunk, self._source_path,
+                        self._supplier_options, self._encoder_options, *chunk))
+                if len(pending) >= self._jobs * 2:
+                    break
+
+            try:
+                while pending:
+                    encoded_frames = pending.popleft().result()
+                    encoder.dump_encoded(buffer, encoded_frames)
+                    frames_written += len(encoded_frames)
+                    if progress:
+                        progress(frames_written)
+
+                    for chunk in chunk_iter:
+                        pending.append(executor.submit(_encode_frame_chunk, self._source_path,
+                                self._supplier_options, self._encoder_options, *chunk))
+                        break
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                # Index whatever was written so the file stays playable
+                encoder.dump_index(buffer)
+
+        return frames_written
+
+def _encode_frame_chunk(source_path: pathlib.Path, supplier_options: dict,
+        encoder_options: dict, start_frame: int, end_frame: int) -> typing.List[bytes]:
+    # Runs in a worker process, so it gets its own capture and encoder
+    contour_supplier = ContourSupplier(source_path, **supplier_options)
+    contour_supplier.seek(start_frame)
+    encoder = VectorVideoEncoder(contour_supplier.framerate, contour_supplier.frame_dimensions,
+            **encoder_options)
+
+    encoded_frames = []
+    for i in range(end_frame - start_frame):
+        encoder.feed_contours(*contour_supplier.get_contours())
+        encoded_frames.append(encoder.encode_frame(i))
+
+    return encoded_frames
+
+# Shared frame slots and ContourSupplier options of a vectorizing worker process
+_worker_frames: typing.Optional[npt.NDArray[np.uint8]] = None
+_worker_shared_frames: typing.Optional[shared_memory.SharedMemory] = None
+_worker_options: typing.Tuple = (96, -1, 0.0, None)
+
+def _init_frame_worker(shared_frames: shared_memory.SharedMemory,
+        shape: typing.Tuple[int, ...], options: typing.Tuple):
+    global _worker_frames, _worker_shared_frames, _worker_options
+    _worker_shared_frames = shared_frames
+    _worker_frames = np.ndarray(shape, dtype=np.uint8, buffer=shared_frames.buf)
+    _worker_options = options
+
+def _find_frame_contours(slot: int) -> typing.Tuple[typing.List, typing.List, typing.List[float]]:
+    return ContourSupplier.find_contours(_worker_frames[slot], *_worker_options)
+
+def _zigzag_encode(values: npt.NDArray[np.int64]) -> npt.NDArray[np.uint64]:
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+def _zigzag_decode(values: npt.NDArray[np.uint64]) -> npt.NDArray[np.int64]:
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+def _encode_varints(values: npt.NDArray[np.uint64]) -> npt.NDArray[np.uint8]:
+    # Little-endian groups of 7 bits, with the high bit set on all but the last byte
+    lengths = np.ones(len(values), dtype=np.int64)
+    for group in range(1, 10):
+        lengths += values >= np.uint64(1 << (7 * group))
+
+    value_bytes = np.repeat(values, lengths)
+    group = np.arange(len(value_bytes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    encoded = ((value_bytes >> (7 * group).astype(np.uint64)) & np.uint64(0x7f)).astype(np.uint8)
+    encoded[group < np.repeat(lengths - 1, lengths)] |= 0x80
+
+    return encoded
+
+def _decode_varints(encoded: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint64]:
+    if len(encoded) == 0:
+        return np.empty(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(encoded < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.arange(len(encoded)) - np.repeat(starts, ends - starts + 1)
+
+    return np.bitwise_or.reduceat((encoded & 0x7f).astype(np.uint64) <<
+            (7 * group).astype(np.uint64), starts)
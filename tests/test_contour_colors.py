@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import pytest
+
+import bad_apple_turtle.vector_video as vector_video
+
+Encoder = vector_video.VectorVideoEncoder
+
+def slow_colors(hierarchy: np.ndarray) -> list:
+    return [Encoder._get_color(hierarchy, index) for index in range(hierarchy.shape[1])]
+
+def random_hierarchy(rng: np.random.Generator, num_contours: int) -> np.ndarray:
+    # Every contour's parent comes before it, like the trees OpenCV gives
+    hierarchy = np.full((1, num_contours, 4), -1, dtype=np.int32)
+    for index in range(1, num_contours):
+        hierarchy[0, index, 3] = rng.integers(-1, index)
+    return hierarchy
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_hierarchies(seed):
+    rng = np.random.default_rng(seed)
+    hierarchy = random_hierarchy(rng, int(rng.integers(1, 400)))
+
+    colors = Encoder._get_colors(hierarchy, hierarchy.shape[1])
+    assert colors.tolist() == slow_colors(hierarchy)
+
+def test_deep_nesting():
+    num_contours = 1000
+    hierarchy = np.full((1, num_contours, 4), -1, dtype=np.int32)
+    hierarchy[0, 1:, 3] = np.arange(num_contours - 1)
+
+    colors = Encoder._get_colors(hierarchy, num_contours)
+    assert colors.tolist() == slow_colors(hierarchy)
+    assert colors.tolist() == [index % 2 for index in range(num_contours)]
+
+@pytest.mark.parametrize("seed", range(10))
+def test_traced_images(seed):
+    rng = np.random.default_rng(seed)
+    image = (rng.random((60, 80)) < 0.5).astype(np.uint8)
+    image = cv2.resize(image, (320, 240), interpolation=cv2.INTER_NEAREST)
+    contours, hierarchy = cv2.findContours(image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+
+    colors = Encoder._get_colors(hierarchy, len(contours))
+    assert colors.tolist() == slow_colors(hierarchy)
+
+def test_no_contours():
+    assert Encoder._get_colors(None, 0).tolist() == []
+    assert Encoder._get_colors(None, 3).tolist() == [0, 0, 0]